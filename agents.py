@@ -9,6 +9,10 @@ class Agent:
         self.company = company
         self.function = self.function.format(company=company)
 
+    def for_company(self, company):
+        # Returns a formatted copy so shared module-level agents stay reusable across concurrent companies
+        return Agent(self.name, self.role, self.function.format(company=company), company)
+
     def __repr__(self) -> str:
         return f"Agent :{self.name} \nRole: {self.role} \nFunction: {self.function}"
 
@@ -45,6 +49,16 @@ primary_analysis_agent = Agent(
 )
 
 
+agent_merge_agent = Agent(
+    name="Agent Merging Agent",
+    role="You are a financial performance analysis agent that consolidates lists of specialized analysis agents. Each list was proposed from a different batch of news articles about the same company.",
+    function="""Your function is to merge the given candidate agents into one list of a MAXIMUM of 5 themed agents. Don't give more than 5.
+    Combine candidates that cover the same financial theme, keep the themes that recur most or matter most for the company's stock price and financial performance, and drop the rest.
+    Keep each description clear, concise, and around 2 lines, in the same format as the candidates.
+    """,
+)
+
+
 agent_creator_agent = Agent(
     name="Agent creating agent",
     role="You are an helpful agent that generates the formatted reply for a given task. Your role is to give back the name of a agent that can do the given prompt task, the role of that child agent that would perfectly describe for it to do the given task and the function that the child agent will perform for it to do the given task. you will write the role and function in second person to describe the agent as this will be used to create and inform the agent of its role and function",
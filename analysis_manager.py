@@ -1,3 +1,4 @@
+import asyncio
 from typing import List
 from schemas import (
     NewsAggregatorResultSchema, 
@@ -8,76 +9,108 @@ from schemas import (
     AgentModelOpenAiResponseSchema,
     AgentDescriptionListOpenAiResponseSchema
 )
-from agents import summary_agent, primary_analysis_agent, agent_creator_agent, Agent
+from agents import summary_agent, primary_analysis_agent, agent_creator_agent, agent_merge_agent, Agent
 from loguru import logger
+from config import settings
+from openai_client import openai_client
+from tokenizer import count_tokens, truncate_to_tokens
 
 
-def summarize_analyses(analysis, openai_client) -> List[NewsAggregatorResultSchema]:
-    def get_summary(analysis, openai_client) -> NewsAggregatorResultSchema:
-        all_reports = [agent_analysis.analysis for agent_analysis in analysis.analysis]
-        all_reports_string = "".join(all_reports)
-        prompt = summary_agent.prompt(all_reports_string)
-        summary = openai_client.query_gpt(prompt, SummaryOpenAiResponseSchema)
-        return NewsAggregatorResultSchema(
-            link=analysis.link,
-            title=analysis.title,
-            published_date=analysis.published_date,
-            classification_score=analysis.score,
-            summary=summary.summary,
-            tags=analysis.tags,
-        )
+# One budget for the analyses and summaries of every company processed by this process
+analysis_semaphore = asyncio.Semaphore(settings.analysis_concurrency)
 
-    articles_with_summaries = []
-    for anl in analysis:
-        all_agents_analysis = get_summary(anl, openai_client)
-        articles_with_summaries.append(all_agents_analysis)
-    logger.info("Summarization done.")
-    return articles_with_summaries
-
-
-def run_analysis(articles, dynamic_agents, openai_client) -> List[ArticleAnalysisResultSchema]:
-    def analyze_article(article, dynamic_agents, openai_client) -> ArticleAnalysisResultSchema:
-        analysis_per_article = []
-        for agent in dynamic_agents:
-            prompt = agent.prompt(f"article:{article.text}")
-            analysis_result_per_agent = openai_client.query_gpt(prompt, AnalysisResultOpenAiResponseSchema)
-            analysis_per_article.append(AgentAnalysisResultSchema(analysis=analysis_result_per_agent.analysis))
-        return ArticleAnalysisResultSchema(
-            link=article.link,
-            title=article.title,
-            score=article.score,
-            analysis=analysis_per_article,
-            published_date=article.published_date,
-            tags=article.tags,
-        )
 
-    all_analysis = []
-    for article in articles:
-        article_analysis_result = analyze_article(article, dynamic_agents, openai_client)
-        all_analysis.append(article_analysis_result)
-    logger.info("Analysis done.")
-    return all_analysis
-
-def create_dynamic_agents(company_based_articles_with_dates, openai_client) -> List[Agent]:
-    def make_dynamic_agents(agents_needed, openai_client):
-        prompts = [agent_creator_agent.prompt(i) for i in agents_needed]
-        agent_meta_data = [openai_client.query_gpt(i, AgentModelOpenAiResponseSchema) for i in prompts]
-        dynamic_agents = [Agent(i.name, i.role, i.function) for i in agent_meta_data]
-        return dynamic_agents
-
-    news = "".join([i.text for i in company_based_articles_with_dates])
-    prompt = primary_analysis_agent.prompt(f"News: {news}")
-    dynamic_agents_descriptions = openai_client.query_gpt(prompt, AgentDescriptionListOpenAiResponseSchema)
+async def limited_query(prompt, response_format):
+    async with analysis_semaphore:
+        return await openai_client.query_gpt(prompt, response_format)
+
+
+async def get_summary(analysis, query) -> NewsAggregatorResultSchema:
+    all_reports = [agent_analysis.analysis for agent_analysis in analysis.analysis]
+    all_reports_string = "".join(all_reports)
+    prompt = summary_agent.prompt(all_reports_string)
+    summary = await query(prompt, SummaryOpenAiResponseSchema)
+    return NewsAggregatorResultSchema(
+        link=analysis.link,
+        title=analysis.title,
+        published_date=analysis.published_date,
+        classification_score=analysis.score,
+        summary=summary.summary,
+        tags=analysis.tags,
+    )
+
+
+async def analyze_article(article, dynamic_agents, query) -> ArticleAnalysisResultSchema:
+    async def analyze(agent):
+        prompt = agent.prompt(f"article:{article.text}")
+        analysis_result_per_agent = await query(prompt, AnalysisResultOpenAiResponseSchema)
+        return AgentAnalysisResultSchema(analysis=analysis_result_per_agent.analysis)
+
+    analysis_per_article = await asyncio.gather(*[analyze(agent) for agent in dynamic_agents])
+    return ArticleAnalysisResultSchema(
+        link=article.link,
+        title=article.title,
+        score=article.score,
+        analysis=analysis_per_article,
+        published_date=article.published_date,
+        tags=article.tags,
+    )
+
+
+async def analyze_and_summarize_article(article, dynamic_agents, query) -> NewsAggregatorResultSchema:
+    analysis = await analyze_article(article, dynamic_agents, query)
+    return await get_summary(analysis, query)
+
+
+def chunk_articles_by_tokens(texts, max_tokens) -> List[str]:
+    # Packs whole articles into chunks of at most max_tokens, cutting any single article that is longer
+    chunks = []
+    current, current_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if tokens > max_tokens:
+            text, tokens = truncate_to_tokens(text, max_tokens), max_tokens
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+async def create_dynamic_agents(company_based_articles_with_dates, openai_client) -> List[Agent]:
+    # Map: themes are extracted from token-budgeted chunks of the news in parallel.
+    # Reduce: with more than one chunk the candidate agents are merged into one list.
+    texts = [i.text for i in company_based_articles_with_dates]
+    chunks = await asyncio.to_thread(chunk_articles_by_tokens, texts, settings.agent_theme_chunk_tokens)
+    chunk_descriptions = await asyncio.gather(
+        *[openai_client.query_gpt(primary_analysis_agent.prompt(f"News: {news}"), AgentDescriptionListOpenAiResponseSchema) for news in chunks]
+    )
+    if len(chunk_descriptions) == 1:
+        dynamic_agents_descriptions = chunk_descriptions[0]
+    else:
+        candidates = "\n".join(
+            f"name:{i.name} description:{i.description}" for descriptions in chunk_descriptions for i in descriptions.agents
+        )
+        prompt = agent_merge_agent.prompt(f"Candidate agents: {candidates}")
+        dynamic_agents_descriptions = await openai_client.query_gpt(prompt, AgentDescriptionListOpenAiResponseSchema)
+    logger.info(f"Themes extracted from {len(chunks)} chunks.")
     agents_needed = [f"name:{i.name} description:{i.description}" for i in dynamic_agents_descriptions.agents]
 
-    n_try = 5
-    for i in range(n_try):
-        try:
-            dynamic_agents = make_dynamic_agents(agents_needed, openai_client)
-            break
-        except Exception as e:
-            logger.info("Failed to create agents, trying again.")
-            if i == n_try - 1:
-                raise e
+    async def make_dynamic_agent(agent_needed):
+        # Each agent is retried on its own, the ones already created are kept
+        n_try = 5
+        for i in range(n_try):
+            try:
+                agent_meta_data = await openai_client.query_gpt(agent_creator_agent.prompt(agent_needed), AgentModelOpenAiResponseSchema)
+                return Agent(agent_meta_data.name, agent_meta_data.role, agent_meta_data.function)
+            except Exception as e:
+                logger.info("Failed to create agent, trying again.")
+                if i == n_try - 1:
+                    raise e
+
+    dynamic_agents = await asyncio.gather(*[make_dynamic_agent(agent_needed) for agent_needed in agents_needed])
     logger.info("Dynamic agents created.")
-    return dynamic_agents
\ No newline at end of file
+    return list(dynamic_agents)
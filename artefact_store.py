@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+from typing import Awaitable, Callable, Type, TypeVar
+from loguru import logger
+from pydantic import BaseModel
+
+from cache import SqliteCache
+from config import settings
+
+
+# Bump to drop every stored artefact, e.g. after changing how they are generated
+ARTEFACT_VERSION = 1
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class ArtefactStore:
+    """Per-company artefacts that change slowly: classification questions, search terms, dynamic agents.
+
+    Keys hold the company, the artefact kind, ARTEFACT_VERSION and a hash of the
+    artefact schema, so an incompatible entry is never read back.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get_key(self, company, kind, schema: Type[BaseModel]):
+        schema_hash = hashlib.sha256(json.dumps(schema.model_json_schema(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        return f"{company.strip().lower()}|{kind}|v{ARTEFACT_VERSION}|{schema_hash}"
+
+    async def get_or_create(self, company, kind, schema: Type[T], create: Callable[[], Awaitable[T]], refresh=False) -> T:
+        if self.cache is None:
+            return await create()
+        key = self.get_key(company, kind, schema)
+        if not refresh:
+            cached = await self.cache.get_async(key)
+            if cached is not None:
+                logger.info(f"Using stored {kind} for {company}.")
+                return schema.model_validate_json(cached)
+        artefact = await create()
+        if isinstance(artefact, schema):
+            await self.cache.set_async(key, artefact.model_dump_json())
+        return artefact
+
+
+artefact_store = ArtefactStore(
+    SqliteCache(
+        os.path.join(settings.cache_dir, "artefacts.sqlite3"),
+        "artefacts",
+        settings.artefact_cache_ttl_seconds,
+        settings.artefact_cache_max_entries,
+    )
+    if settings.artefact_cache_enabled
+    else None
+)
@@ -1,137 +1,117 @@
-from newspaper import Article
-from newspaper import Config
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
 from datetime import date
-from bs4 import BeautifulSoup
-import json
-from dateutil import parser
-import tiktoken
 from dateutil import parser
 from loguru import logger
+from config import settings
+from date_extractor import date_source_counts, reduce_html_for_date
+from extraction import extract_article, get_extraction_executor, reset_extraction_executor
+from html_store import html_store
+from tokenizer import truncate_to_tokens
 from schemas import ArticlePublishedDateOpenAiResponseSchema, ArticleResponseSchema, ArticleWithPublishedDateResponseSchema
 from agents import published_date_agent
 
 
 class ArticleFetcher:
-    def __init__(self, links_tags, openai_client):
+    def __init__(self, links_tags, openai_client, downloader):
         self.links_tags = links_tags
-        self.user_agent = (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/125.0.0.0 Safari/537.36"
-        )
         self.openai_client = openai_client
-        self.config = Config()
-        self.config.browser_user_agent = self.user_agent
-        self.config.request_timeout = 20
+        self.downloader = downloader
+        # Bounds LLM date fallbacks, shared by every caller of resolve_published_date
+        self.date_semaphore = asyncio.Semaphore(settings.date_resolution_concurrency)
 
-    def __fetch_article(self, link_tags):
-        article = Article(link_tags.link, config=self.config)
+    async def download_article(self, link_tags) -> str | None:
+        # Returns the HtmlStore reference of the page
         try:
-            article.download()
-            article.parse()
-            if not article.title:
-                logger.info(f"No title found. URL: {link_tags.link}")
-                return None
-            if not article.text:
-                logger.info(f"No article text found. URL: {link_tags.link}")
-                return None
-            
-            # Truncate the HTML string to half its length
-            html_content = article.html
-            if html_content:
-                html_content = html_content[len(html_content) // 2:]
-
-            return ArticleResponseSchema(
-                link=link_tags.link,
-                tags=link_tags.tags,
-                title=article.title,
-                text=article.text,
-                html=html_content,
-                published_date=article.publish_date
+            html_ref = (
+                await asyncio.to_thread(html_store.get_ref_for_link, link_tags.link)
+                if settings.html_store_reuse_pages
+                else None
             )
+            return html_ref or await self.downloader.download(link_tags.link)
         except Exception as e:
             logger.error(f"Error fetching article: {str(e)}. URL: {link_tags.link}")
             return None
-        
 
-    def get_all_articles(self, max_workers=20) -> List[ArticleResponseSchema]:
-        articles = []
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.__fetch_article, link_tags) for link_tags in self.links_tags]
-            for future in as_completed(futures):
-                try:
-                    fetched_article_with_link = future.result()
-                    if fetched_article_with_link:
-                        articles.append(fetched_article_with_link)
-                except Exception as e:
-                    logger.error(f"Error fetching article: {str(e)}")
-        return articles
+    async def parse_article(self, link_tags, html_ref) -> ArticleResponseSchema | None:
+        # Raises BrokenProcessPool if the page broke a fresh pool too, the company can not be extracted
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = get_extraction_executor()
+            try:
+                extracted = await loop.run_in_executor(executor, extract_article, link_tags.link, html_ref)
+                break
+            except BrokenProcessPool:
+                reset_extraction_executor(executor)
+                if attempt:
+                    raise
+                logger.warning(f"Extraction worker died, retrying with a new pool. URL: {link_tags.link}")
+            except Exception as e:
+                logger.error(f"Error fetching article: {str(e)}. URL: {link_tags.link}")
+                return None
+        if not extracted:
+            logger.info(f"Stored page not found. URL: {link_tags.link}")
+            return None
+        if not extracted["title"]:
+            logger.info(f"No title found. URL: {link_tags.link}")
+            return None
+        if not extracted["text"]:
+            logger.info(f"No article text found. URL: {link_tags.link}")
+            return None
+
+        return ArticleResponseSchema(
+            link=link_tags.link,
+            tags=link_tags.tags,
+            title=extracted["title"],
+            text=extracted["text"],
+            html_ref=html_ref,
+            published_date=extracted["published_date"],
+            published_date_source=extracted["published_date_source"],
+            fingerprint=extracted["fingerprint"],
+        )
     
     
-    def get_published_date(self, articles) -> List[ArticleWithPublishedDateResponseSchema]:
-        articles_with_published_date = []
-        for article in articles:
-            published_date = self.__get_published_date(article)
-            if not published_date or published_date == date(1970, 1, 1):
-                logger.info(f"Published date not found. URL: {article.link}")
-                continue
-            articles_with_published_date.append(ArticleWithPublishedDateResponseSchema(
-                link=article.link, title=article.title, score=article.score, tags=article.tags, published_date=published_date, text=article.text))
-        return articles_with_published_date
+    async def resolve_published_date(self, article) -> ArticleWithPublishedDateResponseSchema | None:
+        try:
+            if article.published_date:
+                published_date = await self.__get_published_date(article)
+            else:
+                async with self.date_semaphore:
+                    published_date = await self.__get_published_date(article)
+        except Exception as e:
+            logger.error(f"Error getting published date: {e}. URL: {article.link}")
+            return None
+        if not published_date or published_date == date(1970, 1, 1):
+            logger.info(f"Published date not found. URL: {article.link}")
+            return None
+        return ArticleWithPublishedDateResponseSchema(
+            link=article.link, title=article.title, score=article.score, tags=article.tags, published_date=published_date, text=article.text)
     
     
-    def __get_published_date(self, article) -> date:
+    async def __get_published_date(self, article) -> date:
+        # The deterministic tiers of date_extractor already ran during extraction
         if article.published_date:
+            date_source_counts[article.published_date_source or "unknown"] += 1
             return article.published_date.date()
-        else:
-            soup = BeautifulSoup(article.html, "html.parser")
-            script_tag = soup.find("script", {"type":"application/ld+json"})
-            if not script_tag:
-                logger.info(f"No script tag found. Trying to get published date via llm. URL: {article.link}")
-                return self.__get_published_date_via_llm(article)
-            try:
-                json_content = json.loads(script_tag.string.strip().replace("\n", "").replace("    ", ""))
-                if "@graph" in json_content:
-                    for item in json_content["@graph"]:
-                        if "datePublished" in item:
-                            datetime_str = item["datePublished"]
-                elif "datePublished" in json_content:
-                    datetime_str = json_content['datePublished']
-                else:
-                    logger.info(f"No datePublished found in json+ld. Trying to get published date via llm. URL: {article.link}")
-                    return self.__get_published_date_via_llm(article)
-                try:
-                    parsed_date = parser.parse(datetime_str)
-                    return parsed_date.date()
-                except (ValueError, TypeError) as e:
-                    logger.info(f"Error parsing published date: {e}, URL: {article.link}")
-                    return self.__get_published_date_via_llm(article)
-            except json.JSONDecodeError as e:
-                logger.info(f"Error decoding json+ld: {e} URL: {article.link}")
-                return self.__get_published_date_via_llm(article)
+        logger.info(f"No published date in page. Trying to get published date via llm. URL: {article.link}")
+        published_date = await self.__get_published_date_via_llm(article)
+        date_source_counts["llm" if published_date and published_date != date(1970, 1, 1) else "not_found"] += 1
+        return published_date
             
             
-    def __get_published_date_via_llm(self, article) -> date:
-        # Initialize tokenizer for the model you are using, e.g., gpt-3.5-turbo
-        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-        max_tokens = 100000
-
-        # Encode the article HTML to tokens
-        tokens = encoding.encode(article.html)
-
-        # Truncate to the first 100,000 tokens if necessary
-        if len(tokens) > max_tokens:
-            tokens = tokens[:max_tokens]
+    async def __get_published_date_via_llm(self, article) -> date:
+        html = html_store.get(article.html_ref)
+        if not html:
+            logger.error(f"Stored page not found. URL: {article.link}")
+            return None
 
-        # Decode the truncated tokens back into a string
-        truncated_html = encoding.decode(tokens)
+        # Only meta tags, header and byline areas go to the model, capped by the shared tokenizer
+        reduced_html = await asyncio.to_thread(reduce_html_for_date, html)
+        truncated_html = truncate_to_tokens(reduced_html, settings.date_llm_max_tokens)
 
-        # Use the truncated HTML in the prompt
         prompt = published_date_agent.prompt(truncated_html)
 
-        response = self.openai_client.query_gpt(prompt, ArticlePublishedDateOpenAiResponseSchema)
+        response = await self.openai_client.query_gpt(prompt, ArticlePublishedDateOpenAiResponseSchema)
         if isinstance(response, ArticlePublishedDateOpenAiResponseSchema):
             parsed_date = parser.parse(response.published_date)
             logger.info(f"Published date fetched via LLM. URL: {parsed_date.date()}")
@@ -0,0 +1,250 @@
+"""Local stand-ins for the OpenAI API, Google Custom Search and article hosts, used by run_benchmarks.
+
+    python -m benchmarks.fake_services --port 8900 --llm-latency-ms 200 --llm-429-rate 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import quote, unquote
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+
+OPENERS = [
+    "On {weekday},", "According to people familiar with the matter,", "In a filing,", "Late in the session,",
+    "During the earnings call,", "Earlier this week,", "In a note to clients,", "After the close,",
+    "Separately,", "Meanwhile,", "In an interview,", "As expected,",
+]
+VERBS = [
+    "reported", "flagged", "cut its outlook for", "raised its forecast for", "warned about", "announced",
+    "disclosed", "highlighted", "is investing in", "scaled back", "expanded", "is reviewing",
+]
+OBJECTS = [
+    "quarterly revenue of {n} million dollars", "a buyback worth {n} million dollars", "margins of {n} percent",
+    "cost cuts of {n} million dollars", "{n} new stores", "a {n} percent rise in orders", "{n} job cuts",
+    "a deal valued at {n} million dollars", "capital spending of {n} million dollars", "{n} new products",
+]
+# Varies otherwise templated sentences, so different articles are not near-duplicates of each other
+TOPICS = (
+    "cloud revenue, supply chain costs, pricing power, labor costs, currency swings, store traffic, ad sales, "
+    "subscription growth, chip shortages, freight rates, interest expense, debt refinancing, tax credits, "
+    "patent litigation, new leadership, a product recall, an acquisition, a spin off, dividend policy, "
+    "inventory levels, wage inflation, energy prices, consumer sentiment, enterprise demand, AI spending"
+).split(", ")
+REGIONS = "Europe, Asia, North America, Latin America, Japan, India, Germany, Brazil, China, Canada, Australia".split(", ")
+WEEKDAYS = "Monday, Tuesday, Wednesday, Thursday, Friday".split(", ")
+SYLLABLES = "ka lo mi ter van sul dor pe ri bax non ell qua tro zen fi".split()
+# Made up product and place names
+NAMES = sorted({"".join(words).capitalize() for words in itertools.product(SYLLABLES, repeat=3)})
+
+
+def sentence(subject, rnd) -> str:
+    opener = rnd.choice(OPENERS).format(weekday=rnd.choice(WEEKDAYS))
+    object_ = rnd.choice(OBJECTS).format(n=rnd.randint(2, 900))
+    return (
+        f"{opener} {subject} {rnd.choice(VERBS)} {object_}, pointing to {rnd.choice(TOPICS)} "
+        f"in {rnd.choice(REGIONS)} and {rnd.choice(TOPICS)}. The {rnd.choice(NAMES)} unit and the "
+        f"{rnd.choice(NAMES)} plant in {rnd.choice(NAMES)} were mentioned."
+    )
+
+
+def stable_hash(text) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def fake_string(name, context, index):
+    if "date" in name:
+        return (date.today() - timedelta(days=index % 3)).isoformat()
+    return f"{context} {name} {index}".strip()
+
+
+def fake_instance(schema, defs, name, context, index=0):
+    """A value that validates against a JSON schema as sent by the OpenAI SDK's structured outputs."""
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].split("/")[-1]]
+    if "anyOf" in schema:
+        schema = next(option for option in schema["anyOf"] if option.get("type") != "null")
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            key: fake_instance(value, defs, key, context, index)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [fake_instance(schema.get("items", {}), defs, name, context, i) for i in range(OPTIONS.list_length)]
+    if kind == "integer":
+        if name == "index":
+            return index
+        return OPTIONS.threshold if name == "threshold" else OPTIONS.score
+    if kind == "number":
+        return float(OPTIONS.score)
+    if kind == "boolean":
+        return True
+    return fake_string(name, context, index)
+
+
+class Options(argparse.Namespace):
+    llm_latency_ms = 50.0
+    llm_429_rate = 0.0
+    search_latency_ms = 20.0
+    article_latency_ms = 20.0
+    results_per_query = 10
+    corpus_size = 5000
+    list_length = 3
+    score = 5
+    threshold = 3
+    irrelevant_rate = 0.1
+    duplicate_rate = 0.1
+    undated_rate = 0.1
+    seed = 0
+
+
+OPTIONS = Options()
+stats = Counter()
+app = FastAPI()
+
+
+async def sleep_ms(mean_ms):
+    # Exponential latencies, so some calls are much slower than the mean
+    if mean_ms > 0:
+        await asyncio.sleep(random.expovariate(1000 / mean_ms))
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    response_format = body.get("response_format", {}).get("json_schema", {})
+    schema_name = response_format.get("name", "text")
+    if random.random() < OPTIONS.llm_429_rate:
+        stats["llm_429"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after-ms": str(int(OPTIONS.llm_latency_ms))},
+            content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+    stats["llm_calls"] += 1
+    stats[f"llm_calls:{schema_name}"] += 1
+    await sleep_ms(OPTIONS.llm_latency_ms)
+
+    user_messages = [message["content"] for message in body.get("messages", []) if message["role"] == "user"]
+    # Short inputs are company names, echoing them keeps search terms and questions company specific.
+    # Longer ones get a digest so that different inputs give different answers, as a real model would
+    last_message = user_messages[-1] if user_messages else ""
+    context = last_message if len(last_message) <= 80 else f"{stable_hash(last_message):08x}"
+    schema = response_format.get("schema", {})
+    content = json.dumps(fake_instance(schema, schema.get("$defs", {}), schema_name, context))
+    prompt_tokens = sum(len(message.get("content", "")) for message in body.get("messages", [])) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{stats['llm_calls']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/customsearch/v1")
+async def custom_search(request: Request, q: str):
+    stats["search_calls"] += 1
+    await sleep_ms(OPTIONS.search_latency_ms)
+    term = q.split(" site:")[0]
+    start = stable_hash(q) % OPTIONS.corpus_size
+    base = str(request.base_url).rstrip("/")
+    items = [
+        {"link": f"{base}/articles/{quote(term, safe='')}/{(start + i) % OPTIONS.corpus_size}?utm_source=search"}
+        for i in range(OPTIONS.results_per_query)
+    ]
+    return {"items": items}
+
+
+@app.get("/articles/{term}/{number}")
+async def article(term: str, number: int):
+    stats["article_requests"] += 1
+    await sleep_ms(OPTIONS.article_latency_ms)
+    term = unquote(term)
+    roll = random.Random(f"{OPTIONS.seed}:{term}:{number}")
+    # Syndicated copies have the text of the previous article of the same term, lightly rewritten
+    body_number = number - 1 if number > 0 and roll.random() < OPTIONS.duplicate_rate else number
+    irrelevant = roll.random() < OPTIONS.irrelevant_rate
+    undated = roll.random() < OPTIONS.undated_rate
+
+    rnd = random.Random(f"{OPTIONS.seed}:{term}:{body_number}")
+    if irrelevant:
+        paragraphs = [" ".join(sentence(rnd.choice(["The index", "The market", "One large fund", "A rival"]), rnd) for _ in range(5)) for _ in range(6)]
+    else:
+        paragraphs = [
+            " ".join(sentence(term, rnd) for _ in range(5))
+            for _ in range(6)
+        ]
+    if body_number != number:
+        paragraphs[-1] = re.sub(r"\d+", lambda match: str(int(match.group()) + 1), paragraphs[-1])
+        paragraphs.insert(0, f"By a staff writer. This story first appeared on a partner site, copy {number}.")
+    title = f"{term} update {body_number}" if not irrelevant else f"Market wrap {body_number}"
+    published = (date.today() - timedelta(days=number % 5)).isoformat()
+    meta = "" if undated else f'<meta property="article:published_time" content="{published}T09:30:00Z">'
+    paragraphs_html = "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    return HTMLResponse(
+        f"<html><head><title>{title}</title>{meta}</head><body><nav>Home Markets News</nav>"
+        f"<article><h1>{title}</h1>{paragraphs_html}</article><footer>Copyright</footer></body></html>"
+    )
+
+
+@app.get("/stats")
+def get_stats():
+    return dict(stats)
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    stats.clear()
+    return {}
+
+
+def add_arguments(parser):
+    parser.add_argument("--llm-latency-ms", type=float, default=Options.llm_latency_ms)
+    parser.add_argument("--llm-429-rate", type=float, default=Options.llm_429_rate)
+    parser.add_argument("--search-latency-ms", type=float, default=Options.search_latency_ms)
+    parser.add_argument("--article-latency-ms", type=float, default=Options.article_latency_ms)
+    parser.add_argument("--results-per-query", type=int, default=Options.results_per_query)
+    parser.add_argument("--corpus-size", type=int, default=Options.corpus_size)
+    parser.add_argument("--list-length", type=int, default=Options.list_length, help="Items in every list the fake LLM returns")
+    parser.add_argument("--irrelevant-rate", type=float, default=Options.irrelevant_rate)
+    parser.add_argument("--duplicate-rate", type=float, default=Options.duplicate_rate)
+    parser.add_argument("--undated-rate", type=float, default=Options.undated_rate)
+    parser.add_argument("--seed", type=int, default=Options.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    parser.parse_args(namespace=OPTIONS)
+    random.seed(OPTIONS.seed)
+    uvicorn.run(app, host=OPTIONS.host, port=OPTIONS.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Offline benchmarks of the /process-news pipeline.
+
+Starts benchmarks/fake_services.py, then runs each scenario in a fresh
+process against it, with its own SQLite database and cache directory, so
+every scenario starts cold and its peak RSS is its own. Results are written
+as JSON:
+
+    python -m benchmarks.run_benchmarks --companies 1,5,10,50 --output benchmark.json
+
+Any setting of config.py can be overridden for the scenarios through the
+environment, e.g. CLASSIFICATION_BATCH_SIZE=5.
+
+The tokenizer's encoding is the one thing fetched from the network. It is
+loaded once before the scenarios into TIKTOKEN_CACHE_DIR, which can point at
+a directory holding the cached file to run fully offline. The exit code is 1
+if any scenario failed or had failed companies.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+from benchmarks.fake_services import add_arguments
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Per-company progress events that start each phase, in pipeline order
+PHASES = ["questions", "search", "articles", "agents", "analysis"]
+
+
+def get_json(url, method="GET"):
+    request = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return get_json(url)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def summarize_events(events, started):
+    """Stage and phase timings from (seconds, company, stage, counts) progress events."""
+    stages = {}
+    for seconds, _, stage, _ in events:
+        entry = stages.setdefault(stage, {"first": seconds, "last": seconds, "events": 0})
+        entry["last"] = seconds
+        entry["events"] += 1
+    for entry in stages.values():
+        entry["wall_seconds"] = round(entry["last"] - entry["first"], 3)
+        entry["first"] = round(entry["first"] - started, 3)
+        entry["last"] = round(entry["last"] - started, 3)
+
+    # A company's phase lasts from its first event to the first event of the next phase it reached
+    by_company = {}
+    for seconds, company, stage, _ in events:
+        by_company.setdefault(company, {}).setdefault(stage, seconds)
+    phases = {}
+    for company_events in by_company.values():
+        end = company_events.get("done", company_events.get("failed"))
+        reached = [(company_events[phase], phase) for phase in PHASES if phase in company_events]
+        for (start, phase), (next_start, _) in zip(reached, reached[1:] + [(end, None)]):
+            if next_start is not None:
+                phases.setdefault(phase, []).append(next_start - start)
+    phases = {
+        phase: {
+            "companies": len(durations),
+            "mean_seconds": round(sum(durations) / len(durations), 3),
+            "max_seconds": round(max(durations), 3),
+        }
+        for phase, durations in phases.items()
+    }
+    return stages, phases
+
+
+async def run_scenario(companies, number_of_days, services_url):
+    # Imported here: settings are read from the environment prepared by the parent process
+    from extraction import shutdown_extraction_executor
+    from news_writer import news_writer
+    from openai_client import close_openai_client
+    from pipeline import process_companies
+
+    get_json(f"{services_url}/stats/reset", "POST")
+    events = []
+
+    def on_progress(company, stage, counts):
+        events.append((time.perf_counter(), company, stage, dict(counts)))
+
+    started = time.perf_counter()
+    errors = await process_companies(companies, number_of_days, on_progress)
+    await news_writer.drain()
+    wall_seconds = time.perf_counter() - started
+    shutdown_extraction_executor()
+    await close_openai_client()
+
+    totals = {}
+    for company in companies:
+        final = {}
+        for _, event_company, _, counts in events:
+            if event_company == company and "error" not in counts:
+                final.update(counts)
+        for key, value in final.items():
+            if isinstance(value, int):
+                totals[key] = totals.get(key, 0) + value
+    stages, phases = summarize_events(events, started)
+    # ru_maxrss is in kilobytes on Linux; children are the extraction workers, once they exited
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "companies": len(companies),
+        "failed_companies": len(errors),
+        "wall_seconds": round(wall_seconds, 3),
+        "articles_per_second": round(totals.get("persisted", 0) / wall_seconds, 3) if wall_seconds else None,
+        "downloads_per_second": round(totals.get("downloaded", 0) / wall_seconds, 3) if wall_seconds else None,
+        "counts": totals,
+        "stages": stages,
+        "phases": phases,
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "peak_rss_children_mb": round(peak_rss_children / 1024, 1),
+        "services": get_json(f"{services_url}/stats"),
+    }
+
+
+def scenario_environment(services_url, directory, args):
+    environment = dict(os.environ)
+    defaults = {
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_MODEL": "benchmark-model",
+        "OPENAI_MODEL_DATES": "benchmark-model-dates",
+        "GOOGLE_SEARCH_API_KEY": "benchmark",
+        "GOOGLE_SEARCH_ENGINE_ID": "benchmark",
+        "GOOGLE_SEARCH_NUMBER_OF_RETRIES": "3",
+        "CLASSIFICATION_SCORE_THRESHOLD": "3",
+        # The real quota would dominate every scenario, it is not what is measured
+        "GOOGLE_SEARCH_REQUESTS_PER_MINUTE": str(args.search_requests_per_minute),
+        "GOOGLE_SEARCH_BURST": str(args.search_requests_per_minute),
+    }
+    for key, value in defaults.items():
+        environment.setdefault(key, value)
+    environment.update(
+        {
+            "DB_URL": json.dumps([f"sqlite:///{os.path.join(directory, 'news.sqlite3')}"]),
+            "CACHE_DIR": os.path.join(directory, "cache"),
+            "OPENAI_BASE_URL": f"{services_url}/v1",
+            "GOOGLE_SEARCH_ENGINE_URL": f"{services_url}/customsearch/v1",
+        }
+    )
+    return environment
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", default="1,5,10,50", help="Comma separated number of companies per scenario")
+    parser.add_argument("--number-of-days", type=int, default=7)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--search-requests-per-minute", type=int, default=60000)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--scenario", type=int, help=argparse.SUPPRESS)
+    add_arguments(parser)
+    args = parser.parse_args()
+    services_url = f"http://127.0.0.1:{args.port}"
+
+    if args.scenario is not None:
+        companies = [f"Company {i} Inc" for i in range(args.scenario)]
+        result = asyncio.run(run_scenario(companies, args.number_of_days, services_url))
+        print(json.dumps(result))
+        return
+
+    # Scenarios inherit the cache directory, so none of them downloads the encoding
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache"))
+    try:
+        from tokenizer import get_encoding
+
+        get_encoding()
+    except Exception as e:
+        sys.exit(
+            f"Could not load the tokenizer encoding: {e!r}. Run once with network access, or set "
+            f"TIKTOKEN_CACHE_DIR to a directory holding the cached encoding file "
+            f"(now {os.environ['TIKTOKEN_CACHE_DIR']})."
+        )
+
+    service_arguments = [
+        f"--{key.replace('_', '-')}={value}"
+        for key, value in vars(args).items()
+        if key not in ("companies", "number_of_days", "port", "search_requests_per_minute", "output", "scenario")
+    ]
+    services = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_services", f"--port={args.port}", *service_arguments], cwd=ROOT
+    )
+    results = []
+    try:
+        wait_for(f"{services_url}/stats")
+        for number_of_companies in [int(n) for n in args.companies.split(",") if n.strip()]:
+            with tempfile.TemporaryDirectory(prefix="news-benchmark-") as directory:
+                log_path = os.path.join(directory, "scenario.log")
+                with open(log_path, "w") as log:
+                    completed = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.run_benchmarks", f"--scenario={number_of_companies}",
+                         f"--port={args.port}", f"--number-of-days={args.number_of_days}"],
+                        cwd=ROOT, env=scenario_environment(services_url, directory, args), stdout=subprocess.PIPE,
+                        stderr=log, text=True,
+                    )
+                if completed.returncode != 0:
+                    with open(log_path) as log:
+                        tail = log.read()[-4000:]
+                    result = {"companies": number_of_companies, "error": f"exit code {completed.returncode}", "log": tail}
+                else:
+                    result = json.loads(completed.stdout.strip().splitlines()[-1])
+                    if result["failed_companies"]:
+                        result["error"] = f"{result['failed_companies']} of {number_of_companies} companies failed"
+            results.append(result)
+            print(
+                f"{number_of_companies} companies: {result.get('wall_seconds')} s, "
+                f"{result.get('articles_per_second')} articles/s, peak RSS {result.get('peak_rss_mb')} MB"
+                + (f", FAILED: {result['error']}" if "error" in result else ""),
+                file=sys.stderr,
+            )
+    finally:
+        services.terminate()
+        services.wait()
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "commit": get_commit(),
+        "options": {key: value for key, value in vars(args).items() if key != "scenario"},
+        "failed_scenarios": sum("error" in result for result in results),
+        "scenarios": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    if report["failed_scenarios"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteCache:
+    """Key/value store on a local SQLite file with a TTL and LRU eviction by entry count."""
+
+    def __init__(self, path, table, ttl_seconds, max_entries, prune_interval=100):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self.hits = 0
+        self.misses = 0
+        self.writes_since_prune = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_accessed_at ON {table} (accessed_at)")
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_created_at ON {table} (created_at)")
+        self.prune()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self.connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self.connection.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.writes_since_prune += 1
+            prune = self.writes_since_prune >= self.prune_interval
+        if prune:
+            self.prune()
+
+    # Reads update accessed_at and writes may prune, event loop code uses these
+    async def get_async(self, key):
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key, value):
+        await asyncio.to_thread(self.set, key, value)
+
+    def delete(self, key):
+        with self.lock:
+            self.connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self):
+        # Drops expired entries, then the least recently used ones beyond max_entries. Both
+        # only visit the rows they delete through the created_at and accessed_at indexes
+        with self.lock:
+            self.writes_since_prune = 0
+            if self.ttl_seconds:
+                self.connection.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            if self.max_entries:
+                (count,) = self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+                if count > self.max_entries:
+                    self.connection.execute(
+                        f"DELETE FROM {self.table} WHERE key IN "
+                        f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
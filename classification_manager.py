@@ -1,39 +1,111 @@
+import asyncio
 from loguru import logger
 from config import settings
-from schemas import ArticleClassificationScoreSchema, ArticleResponseSchema, ClassificationScoreOpenAiResponseSchema
-from agents import news_classification_agent
+from schemas import (
+    ArticleClassificationScoreSchema,
+    ClassificationScoreOpenAiResponseSchema,
+    BatchClassificationScoreOpenAiResponseSchema,
+)
+from agents import news_classification_agent, Agent
 from typing import List
 
 
-def filter_company_based_articles(articles: List[ArticleResponseSchema], openai_client, company, questions_and_threshold) -> List[ArticleClassificationScoreSchema]:
-    all_articles = get_classification_score_of_company_based_news(articles, openai_client, company, questions_and_threshold)
-    filtered_articles = [result for result in all_articles if result.score >= questions_and_threshold.threshold]
-    sorted_filtered_articles = sorted(filtered_articles, key=lambda x: x.score, reverse=True)
-    logger.info("Number of articles before classification: {length}.".format(length=len(articles)))
-    logger.info("Number of articles after classification: {}.".format(len(filtered_articles)))
-    return sorted_filtered_articles
+async def get_classification_score_of_company_based_news(articles, openai_client, company, questions_and_threshold) -> List[ArticleClassificationScoreSchema | None]:
+    # Results keep the input order; articles that fail or time out are None
+    semaphore = asyncio.Semaphore(settings.classification_concurrency)
+    results = [None] * len(articles)
 
-def get_classification_score_of_company_based_news(articles, openai_client, company, questions_and_threshold) -> List[ArticleClassificationScoreSchema]:
-    results = []
-    for article in articles:
-        result = get_classification_result(article, openai_client, company, questions_and_threshold)
-        results.append(result)
+    async def classify_single(index):
+        async with semaphore:
+            result = await get_classification_result(articles[index], openai_client, company, questions_and_threshold)
+        results[index] = result
+
+    async def classify_batch(indexes):
+        async with semaphore:
+            scores = await get_batch_classification_scores([articles[i] for i in indexes], openai_client, company, questions_and_threshold)
+        missing = []
+        for index, score in zip(indexes, scores):
+            if score is None:
+                missing.append(index)
+            else:
+                results[index] = build_classification_result(articles[index], score)
+        # Articles the batch call did not score are retried one by one
+        await asyncio.gather(*[classify_single(index) for index in missing])
+
+    batch_size = settings.classification_batch_size
+    if batch_size > 1:
+        short = [i for i, article in enumerate(articles) if len(article.text) <= settings.classification_batch_max_chars]
+        single = [i for i, article in enumerate(articles) if len(article.text) > settings.classification_batch_max_chars]
+        batches = [short[i:i + batch_size] for i in range(0, len(short), batch_size)]
+        # A batch of one would only pay for the longer batch prompt
+        if batches and len(batches[-1]) == 1:
+            single.extend(batches.pop())
+    else:
+        single = list(range(len(articles)))
+        batches = []
+
+    await asyncio.gather(
+        *[classify_single(index) for index in single],
+        *[classify_batch(indexes) for indexes in batches],
+    )
     return results
 
-def get_classification_result(article, openai_client, company, questions_and_threshold) -> ArticleClassificationScoreSchema:
+def get_classification_agent(questions_and_threshold) -> Agent:
+    # A fresh agent per run, the shared news_classification_agent must not be mutated
     combined_questions = "\n".join(questions_and_threshold.questions)
-    news_classification_agent.function = combined_questions
-    prompt = news_classification_agent.prompt(f"link: {article.link}, company name: {company} title: {article.title}, text: {article.text}")
-    output = openai_client.query_gpt(prompt, ClassificationScoreOpenAiResponseSchema)
+    return Agent(news_classification_agent.name, news_classification_agent.role, combined_questions)
+
+def build_classification_result(article, score) -> ArticleClassificationScoreSchema:
+    return ArticleClassificationScoreSchema(
+        link=article.link,
+        title=article.title,
+        score=score,
+        tags=article.tags,
+        text=article.text,
+        published_date=article.published_date,
+        published_date_source=article.published_date_source,
+        html_ref=article.html_ref,
+    )
+
+async def get_classification_result(article, openai_client, company, questions_and_threshold) -> ArticleClassificationScoreSchema | None:
+    prompt = get_classification_agent(questions_and_threshold).prompt(f"link: {article.link}, company name: {company} title: {article.title}, text: {article.text}")
+    try:
+        output = await asyncio.wait_for(
+            openai_client.query_gpt(prompt, ClassificationScoreOpenAiResponseSchema),
+            timeout=settings.classification_timeout_seconds,
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Classification timed out. URL: {article.link}")
+        return None
+    except Exception as e:
+        logger.error(f"Classification failed: {e}. URL: {article.link}")
+        return None
     if isinstance(output, ClassificationScoreOpenAiResponseSchema):
-        return ArticleClassificationScoreSchema(
-            link=article.link,
-            title=article.title,
-            score=output.score,
-            tags=article.tags,
-            text=article.text,
-            published_date=article.published_date,
-            html=article.html,
+        return build_classification_result(article, output.score)
+    else:
+        logger.error("Classification response schema is not valid.")
+
+async def get_batch_classification_scores(articles, openai_client, company, questions_and_threshold) -> List[int | None]:
+    articles_prompt = "\n\n".join(
+        f"[{index}] link: {article.link}, title: {article.title}, text: {article.text}" for index, article in enumerate(articles)
+    )
+    prompt = get_classification_agent(questions_and_threshold).prompt(
+        f"company name: {company}. Score each of the following articles independently "
+        f"and return one score per article with its index.\n\n{articles_prompt}"
+    )
+    try:
+        output = await asyncio.wait_for(
+            openai_client.query_gpt(prompt, BatchClassificationScoreOpenAiResponseSchema),
+            timeout=settings.classification_timeout_seconds,
         )
+    except Exception as e:
+        logger.error(f"Batch classification failed: {e!r}. Falling back to single article calls.")
+        return [None] * len(articles)
+    scores = [None] * len(articles)
+    if isinstance(output, BatchClassificationScoreOpenAiResponseSchema):
+        for item in output.scores:
+            if 0 <= item.index < len(articles):
+                scores[item.index] = item.score
     else:
-        logger.error("Classification response schema is not valid.")
\ No newline at end of file
+        logger.error("Batch classification response schema is not valid.")
+    return scores
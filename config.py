@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import ValidationError
 
@@ -11,18 +12,116 @@ class Settings(BaseSettings):
     )
 
     db_url: list[str]
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_recycle_seconds: int = 1800
+    # "all" waits for every database, "primary" waits for the first db_url
+    # and replicates to the others in the background
+    db_write_mode: Literal["all", "primary"] = "all"
 
     openai_api_key: str
     openai_model: str
     openai_model_dates: str
+    # Any OpenAI compatible endpoint, e.g. the fake one of benchmarks/fake_services.py
+    openai_base_url: str | None = None
 
     google_search_api_key: str
     google_search_engine_id: str
     google_search_engine_url: str = "https://www.googleapis.com/customsearch/v1"
     google_search_number_of_retries: int
+    # Custom Search requests allowed per minute for the whole process and how many may go out at once
+    google_search_requests_per_minute: int = 90
+    google_search_burst: int = 90
+    google_search_concurrency: int = 10
+    google_search_timeout_seconds: float = 20
+    # Custom Search responses are cached per query and date window
+    search_cache_enabled: bool = True
+    search_cache_ttl_seconds: int = 6 * 60 * 60
+    search_cache_max_entries: int = 20000
+    # Incremental mode only searches the days since the last cached run of a query, as long as
+    # the results kept from earlier runs carry a published date in their page metadata
+    search_cache_incremental: bool = False
+    search_cache_incremental_ttl_seconds: int = 7 * 24 * 60 * 60
 
     classification_score_threshold: int
 
+    # Article downloads, shared by all companies of a request
+    article_download_concurrency: int = 20
+    article_per_host_concurrency: int = 4
+    article_download_timeout_seconds: float = 20
+    article_download_retries: int = 2
+    article_validator_cache_enabled: bool = True
+    article_validator_cache_ttl_seconds: int = 30 * 24 * 60 * 60
+    article_validator_cache_max_entries: int = 20000
+    # Downloaded pages are kept compressed under cache_dir/html
+    html_store_ttl_seconds: int = 30 * 24 * 60 * 60
+    # Reprocess pages already in the HTML store instead of downloading them again
+    html_store_reuse_pages: bool = False
+    # In-flight LLM published date lookups per company
+    date_resolution_concurrency: int = 10
+    # Token budget of the reduced page sent to the date extraction LLM
+    date_llm_max_tokens: int = 2000
+    # Title/text/date extraction runs in a process pool, None uses one process per core
+    extraction_workers: int | None = None
+    # How the workers are started, "forkserver" is not available on Windows
+    extraction_start_method: Literal["forkserver", "spawn"] = "forkserver"
+
+    # Number of companies processed concurrently by /process-news
+    company_concurrency: int = 3
+    # Background jobs: worker tasks and where jobs are kept ("sqlite" under cache_dir or "memory")
+    job_workers: int = 2
+    job_store_backend: Literal["memory", "sqlite"] = "sqlite"
+    # Seconds between writes of a running job's progress
+    job_progress_interval_seconds: float = 1.0
+
+    # In-flight classification requests per company and per-request timeout
+    classification_concurrency: int = 10
+    classification_timeout_seconds: float = 60
+    # Articles shorter than classification_batch_max_chars are scored
+    # classification_batch_size at a time in one call; 1 disables batching
+    classification_batch_size: int = 1
+    classification_batch_max_chars: int = 2000
+    # How long a batch waits for more articles once it has one
+    classification_batch_wait_seconds: float = 0.5
+
+    # In-flight agent analysis and summary requests of the whole process, shared by all companies
+    analysis_concurrency: int = 10
+    # Token budget of one chunk of news when extracting themes for the dynamic agents
+    agent_theme_chunk_tokens: int = 20000
+
+    # Capacity of the queues between pipeline stages and summaries stored per write
+    pipeline_queue_size: int = 50
+    persist_batch_size: int = 10
+
+    # Local SQLite caches live under cache_dir
+    cache_dir: str = ".cache"
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: int = 7 * 24 * 60 * 60
+    llm_cache_max_entries: int = 50000
+    # Near-duplicate articles, by SimHash distance in bits
+    near_duplicate_enabled: bool = True
+    # Measured on 700-word texts: 1% of words replaced or a byline and footer added is up to 9 bits,
+    # 3% replaced up to 14, while unrelated texts are 19 bits or more apart (median 31)
+    near_duplicate_max_distance: int = 12
+    near_duplicate_lookback_days: int = 90
+    # Lexical prefilter before the LLM classifier, articles scoring below prefilter_min_score
+    # (0..1) that do not mention the company are pruned
+    prefilter_enabled: bool = True
+    prefilter_min_score: float = 0.05
+    prefilter_shadow_rate: float = 0.1
+    # Other names the news uses for a company, e.g. {"Alphabet Inc.": ["Google"]}
+    company_aliases: dict[str, list[str]] = {}
+    # Read API
+    news_page_size: int = 50
+    news_page_max_size: int = 200
+    news_cache_enabled: bool = True
+    news_cache_ttl_seconds: int = 60
+    news_cache_max_entries: int = 1000
+    # Questions, search terms and dynamic agents generated per company
+    artefact_cache_enabled: bool = True
+    artefact_cache_ttl_seconds: int = 7 * 24 * 60 * 60
+    artefact_cache_max_entries: int = 5000
+
     def __init__(self, **data):
         super().__init__(**data)
         # Parse DB_URL as a list if it's a comma-separated string
@@ -0,0 +1,171 @@
+import html as html_lib
+import re
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlsplit
+from dateutil import parser
+from lxml import etree
+from lxml import html as lxml_html
+
+
+# How often each tier resolved an article's published date, "llm" and "not_found" included
+date_source_counts = Counter()
+
+LD_JSON_BLOCK = re.compile(r"<script[^>]+application/ld\+json[^>]*>(.*?)</script>", re.IGNORECASE | re.DOTALL)
+LD_JSON_DATE_PUBLISHED = re.compile(r'"datePublished"\s*:\s*"([^"]+)"')
+META_TAG = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+ATTRIBUTE = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+TIME_TAG = re.compile(r"<time\s[^>]*datetime\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+URL_DATE = re.compile(r"/(20\d{2})[/-](0[1-9]|1[0-2])[/-](0[1-9]|[12]\d|3[01])(?:/|-|$)")
+# Only "Published", an "Updated" date would make evergreen articles look recent
+PUBLISHED_TEXT_DATE = re.compile(r"Published\s+(?:on\s+)?([A-Z][a-z]+\.? \d{1,2}, \d{4})")
+
+META_DATE_NAMES = (
+    "article:published_time",
+    "og:published_time",
+    "datepublished",
+    "parsely-pub-date",
+    "sailthru.date",
+    "pubdate",
+    "publishdate",
+    "dc.date.issued",
+    "dc.date",
+    "date",
+)
+
+
+def parse_date(value) -> datetime | None:
+    try:
+        parsed = parser.parse(html_lib.unescape(value.strip()))
+    except (ValueError, TypeError, OverflowError):
+        return None
+    # Rejects dates the parser invented from unrelated numbers
+    if not 1995 <= parsed.year <= datetime.now().year + 1:
+        return None
+    return parsed
+
+
+def from_ld_json(html) -> datetime | None:
+    # Every ld+json block, including @graph and list forms, without building a DOM
+    for block in LD_JSON_BLOCK.findall(html):
+        for value in LD_JSON_DATE_PUBLISHED.findall(block):
+            parsed = parse_date(value)
+            if parsed:
+                return parsed
+    return None
+
+
+def from_meta(html) -> datetime | None:
+    candidates = {}
+    for tag in META_TAG.findall(html):
+        attributes = {key.lower(): first or second for key, first, second in ATTRIBUTE.findall(tag)}
+        name = (attributes.get("property") or attributes.get("name") or attributes.get("itemprop") or "").lower()
+        if name in META_DATE_NAMES and attributes.get("content") and name not in candidates:
+            candidates[name] = attributes["content"]
+    for name in META_DATE_NAMES:
+        if name in candidates:
+            parsed = parse_date(candidates[name])
+            if parsed:
+                return parsed
+    return None
+
+
+def from_time_tag(html) -> datetime | None:
+    match = TIME_TAG.search(html)
+    return parse_date(match.group(1)) if match else None
+
+
+def from_byline_time_tag(html) -> datetime | None:
+    try:
+        tree = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None
+    for value in tree.xpath('//*[contains(@class, "byline")]//time/@datetime | //article//time/@datetime'):
+        parsed = parse_date(value)
+        if parsed:
+            return parsed
+    return None
+
+
+def from_url(link) -> datetime | None:
+    match = URL_DATE.search(urlsplit(link).path)
+    return parse_date("-".join(match.groups())) if match else None
+
+
+def from_site_rules(link, html) -> datetime | None:
+    host = urlsplit(link).netloc.lower()
+    if host.endswith("fool.com"):
+        # /investing/2024/05/02/slug/
+        return from_url(link)
+    if host.endswith("finance.yahoo.com"):
+        # The byline carries <time datetime="...">; time tags in the navigation are other dates
+        return from_byline_time_tag(html)
+    if host.endswith("investopedia.com"):
+        # The attribution block reads "Published March 5, 2024"
+        match = PUBLISHED_TEXT_DATE.search(html)
+        return parse_date(match.group(1)) if match else None
+    return None
+
+
+def extract_published_date(link, html, newspaper_date=None) -> tuple[datetime | None, str | None]:
+    """Returns the published date of a page and the tier that found it."""
+    # Structured data the publisher declares wins over what site rules read from the page
+    tiers = (
+        ("ld_json", lambda: from_ld_json(html)),
+        ("meta", lambda: from_meta(html)),
+        ("site_rule", lambda: from_site_rules(link, html)),
+        ("newspaper", lambda: newspaper_date),
+        ("time_tag", lambda: from_time_tag(html)),
+        ("url", lambda: from_url(link)),
+    )
+    for source, extract in tiers:
+        published_date = extract()
+        if published_date:
+            return published_date, source
+    return None, None
+
+
+DATE_HINT = re.compile(r"byline|date|time|publish|updated|posted|author|attribution|header|article-meta", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+BOILERPLATE_TAGS = ("script", "style", "noscript", "svg", "nav", "footer", "aside", "form", "iframe", "button", "select")
+
+
+def reduce_html_for_date(html, max_chars=8000) -> str:
+    """Reduces a page to the parts likely to hold its published date.
+
+    Keeps meta tags, the title, ld+json, <time> elements, the page header and
+    short elements whose class or id hints at a byline or date, one per line.
+    """
+    try:
+        tree = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return WHITESPACE.sub(" ", re.sub(r"<[^>]+>", " ", html))[:max_chars]
+
+    lines = []
+    title = tree.findtext(".//title")
+    if title:
+        lines.append(f"title: {title.strip()}")
+    for meta in tree.iter("meta"):
+        key = meta.get("property") or meta.get("name") or meta.get("itemprop")
+        content = meta.get("content")
+        if key and content and len(content) <= 200:
+            lines.append(f"meta {key}: {content}")
+    for script in tree.xpath('//script[@type="application/ld+json"]'):
+        if script.text:
+            lines.append(f"ld+json: {WHITESPACE.sub(' ', script.text)[:1000]}")
+
+    etree.strip_elements(tree, etree.Comment, *BOILERPLATE_TAGS, with_tail=False)
+
+    for element in tree.iter("time"):
+        lines.append(f"time {element.get('datetime', '')}: {WHITESPACE.sub(' ', element.text_content()).strip()}")
+    for element in tree.xpath("//header | //h1 | //*[@class or @id]"):
+        hint = f"{element.tag} {element.get('class', '')} {element.get('id', '')}"
+        if element.tag in ("header", "h1") or DATE_HINT.search(hint):
+            text = WHITESPACE.sub(" ", element.text_content()).strip()
+            if 0 < len(text) <= 300:
+                lines.append(text)
+
+    if not lines:
+        body = tree.find("body")
+        lines.append(WHITESPACE.sub(" ", (body if body is not None else tree).text_content()).strip())
+    return "\n".join(dict.fromkeys(lines))[:max_chars]
@@ -1,13 +1,26 @@
 from datetime import datetime, date
-from sqlalchemy import create_engine, ForeignKey
+from loguru import logger
+from sqlalchemy import create_engine, ForeignKey, Index, inspect, text
 from sqlalchemy.orm import Session, sessionmaker, Mapped, mapped_column, relationship
 from sqlalchemy.ext.declarative import as_declarative, DeclarativeMeta
 from sqlalchemy.types import Integer, BigInteger, String, Text, DateTime, Date
 
 from config import settings
 
+def create_db_engine(url):
+    options = {"pool_pre_ping": True}
+    # SQLite engines use their own pool classes that take no sizing options
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_recycle=settings.db_pool_recycle_seconds,
+        )
+    return create_engine(url, **options)
+
+
 #For multiple DBs
-engines = [create_engine(url) for url in settings.db_url]
+engines = [create_db_engine(url) for url in settings.db_url]
 
 
 class BaseMetaClass(DeclarativeMeta):
@@ -41,6 +54,8 @@ class NewsModel(BaseModel):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     published_date: Mapped[date] = mapped_column(Date, nullable=True)
     company_name: Mapped[str] = mapped_column(String, unique=False, nullable=True)
+    # SimHash of the article text, see near_duplicates
+    fingerprint: Mapped[int] = mapped_column(BigInteger, nullable=True)
 
     tags: Mapped[list["TagModel"]] = relationship("TagModel", secondary="news_tags", back_populates="news")
 
@@ -62,8 +77,75 @@ class NewsTagsModel(BaseModel):
     tag_id: Mapped[int] = mapped_column(Integer, ForeignKey("tag.id"))
 
 
-for engine in engines:
+# Newest news of a company, and newest news overall, are index range scans
+Index("ix_news_company_name_published_date", NewsModel.company_name, NewsModel.published_date.desc(), NewsModel.id.desc())
+Index("ix_news_published_date", NewsModel.published_date.desc(), NewsModel.id.desc())
+# The unique constraint on link is a btree; equality lookups of links only need the smaller hash index
+Index("ix_news_link_hash", NewsModel.link, postgresql_using="hash").ddl_if(dialect="postgresql")
+# One row per (news, tag), it also serves news -> tags lookups
+Index("ux_news_tags_news_id_tag_id", NewsTagsModel.news_id, NewsTagsModel.tag_id, unique=True)
+Index("ix_news_tags_tag_id_news_id", NewsTagsModel.tag_id, NewsTagsModel.news_id)
+
+
+def migrate(engine):
+    """Creates missing tables, columns and indexes, also on databases created before they existed.
+
+    Only what inspection shows to be missing is changed, so an up to date database costs a few
+    catalog queries. Duplicate news_tags rows would make the unique index fail, so they are
+    removed before it is created. On PostgreSQL indexes of existing tables are built
+    concurrently, without blocking writes.
+    """
     BaseModel.metadata.create_all(engine)
+    inspector = inspect(engine)
+    existing_indexes = {
+        table.name: {index["name"] for index in inspector.get_indexes(table.name)}
+        for table in BaseModel.metadata.sorted_tables
+    }
+    # The hash index is PostgreSQL only (see ddl_if above)
+    missing_indexes = [
+        index
+        for table in BaseModel.metadata.sorted_tables
+        for index in table.indexes
+        if index.name not in existing_indexes[table.name]
+        and (index.name != "ix_news_link_hash" or engine.dialect.name == "postgresql")
+    ]
+    news_columns = {column["name"] for column in inspector.get_columns("news")}
+
+    with engine.begin() as connection:
+        # Columns added after the table was first created
+        if "fingerprint" not in news_columns:
+            connection.execute(text("ALTER TABLE news ADD COLUMN fingerprint BIGINT"))
+        if "ux_news_tags_news_id_tag_id" in {index.name for index in missing_indexes}:
+            deleted = connection.execute(
+                text(
+                    "DELETE FROM news_tags WHERE id NOT IN "
+                    "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM news_tags GROUP BY news_id, tag_id) AS kept)"
+                )
+            ).rowcount
+            if deleted:
+                logger.info(f"Removed {deleted} duplicate news_tags rows from {engine.url.database}.")
+
+    if not missing_indexes:
+        return
+    if engine.dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            for index in missing_indexes:
+                logger.info(f"Creating index {index.name} on {engine.url.database}.")
+                index.dialect_options["postgresql"]["concurrently"] = True
+                try:
+                    index.create(connection, checkfirst=True)
+                finally:
+                    index.dialect_options["postgresql"]["concurrently"] = False
+    else:
+        with engine.begin() as connection:
+            for index in missing_indexes:
+                logger.info(f"Creating index {index.name} on {engine.url.database}.")
+                index.create(connection, checkfirst=True)
+
+
+for engine in engines:
+    migrate(engine)
 
 
 Sessions: list[Session] = [sessionmaker(engine) for engine in engines]
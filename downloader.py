@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+from urllib.parse import urlsplit
+import httpx
+from loguru import logger
+
+from cache import SqliteCache
+from config import settings
+from html_store import html_store
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/125.0.0.0 Safari/537.36"
+)
+
+# ETag / Last-Modified and the stored page they belong to, for conditional GETs
+validator_cache = (
+    SqliteCache(
+        os.path.join(settings.cache_dir, "article_cache.sqlite3"),
+        "http_validators",
+        settings.article_validator_cache_ttl_seconds,
+        settings.article_validator_cache_max_entries,
+    )
+    if settings.article_validator_cache_enabled
+    else None
+)
+
+
+class ArticleDownloader:
+    """Downloads article pages over one pooled keep-alive HTTP client.
+
+    Meant to be shared by every company of a request: connections to the same
+    host are reused, and at most article_per_host_concurrency requests hit one
+    host at a time.
+    """
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=settings.article_download_timeout_seconds,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=settings.article_download_concurrency,
+                max_keepalive_connections=settings.article_download_concurrency,
+            ),
+        )
+        self.host_semaphores: dict[str, asyncio.Semaphore] = {}
+        self.stats = {"downloaded": 0, "not_modified": 0, "failed": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def get_host_semaphore(self, url) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(settings.article_per_host_concurrency)
+        return self.host_semaphores[host]
+
+    async def download(self, url) -> str | None:
+        """Downloads a page into the HTML store and returns its reference."""
+        cached = json.loads(await validator_cache.get_async(url) or "null") if validator_cache is not None else None
+        if cached and not html_store.has(cached.get("ref")):
+            cached = None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self.get_host_semaphore(url):
+            response = await self.get(url, headers)
+        if response is None:
+            self.stats["failed"] += 1
+            return None
+
+        if response.status_code == 304 and cached:
+            self.stats["not_modified"] += 1
+            return cached["ref"]
+        if response.status_code != 200:
+            logger.info(f"Article download failed with HTTP {response.status_code}. URL: {url}")
+            self.stats["failed"] += 1
+            return None
+
+        self.stats["downloaded"] += 1
+        ref = await asyncio.to_thread(html_store.put, response.text, url)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if validator_cache is not None and (etag or last_modified):
+            await validator_cache.set_async(url, json.dumps({"etag": etag, "last_modified": last_modified, "ref": ref}))
+        return ref
+
+    async def get(self, url, headers) -> httpx.Response | None:
+        for attempt in range(settings.article_download_retries + 1):
+            try:
+                response = await self.client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                logger.info(f"Error downloading article: {e!r}. URL: {url}")
+                response = None
+            else:
+                if response.status_code not in (429, 503):
+                    return response
+            if attempt == settings.article_download_retries:
+                return response
+            # Back off politely, holding the host slot so the host sees less traffic
+            retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+            delay = min(int(retry_after), 30) if retry_after.isdigit() else 2 ** attempt
+            await asyncio.sleep(delay)
+        return None
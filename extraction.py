@@ -0,0 +1,63 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from newspaper import Article, Config
+
+from config import settings
+from date_extractor import extract_published_date
+from html_store import html_store
+from simhash import simhash
+
+
+# Runs in the extraction worker processes. Everything here has to be importable
+# and picklable, results are plain dicts.
+
+newspaper_config = Config()
+newspaper_config.fetch_images = False
+
+
+def extract_article(link, html_ref) -> dict | None:
+    # The page is read from the store here so it never crosses the process boundary
+    html = html_store.get(html_ref)
+    if not html:
+        return None
+    article = Article(link, config=newspaper_config)
+    article.download(input_html=html)
+    article.parse()
+    published_date, published_date_source = extract_published_date(link, html, article.publish_date)
+    return {
+        "title": article.title,
+        "text": article.text,
+        "published_date": published_date,
+        "published_date_source": published_date_source,
+        "fingerprint": simhash(article.text) if article.text else None,
+    }
+
+
+executor: ProcessPoolExecutor | None = None
+
+
+def get_extraction_executor() -> ProcessPoolExecutor:
+    global executor
+    if executor is None:
+        # Forking the server would copy its event loop, open connections and threads into the workers
+        executor = ProcessPoolExecutor(
+            max_workers=settings.extraction_workers,
+            mp_context=multiprocessing.get_context(settings.extraction_start_method),
+        )
+    return executor
+
+
+def reset_extraction_executor(broken: ProcessPoolExecutor):
+    # A worker that died (OOM kill, crash in a parser) breaks the whole pool for good. Only the
+    # first caller that sees it broken replaces it, the others already get the new one
+    global executor
+    if executor is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        executor = None
+
+
+def shutdown_extraction_executor():
+    global executor
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+        executor = None
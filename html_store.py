@@ -0,0 +1,91 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+import zlib
+from loguru import logger
+
+from cache import SqliteCache
+from config import settings
+
+
+class HtmlStore:
+    """Content-addressed store of raw article pages.
+
+    Pages are zlib-compressed into one file per SHA-256 of their content and read
+    back through mmap, so pipeline objects only carry the hex digest. A link index
+    remembers the latest page of every downloaded link.
+    """
+
+    def __init__(self, directory, ttl_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._link_index = None
+
+    @property
+    def link_index(self) -> SqliteCache:
+        # Created on first use: extraction workers import this module but only read pages, they never open it
+        if self._link_index is None:
+            self._link_index = SqliteCache(os.path.join(self.directory, "links.sqlite3"), "pages", self.ttl_seconds, 0)
+        return self._link_index
+
+    def get_path(self, ref):
+        return os.path.join(self.directory, ref[:2], f"{ref}.z")
+
+    def put(self, html, link=None) -> str:
+        data = html.encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.get_path(ref)
+        if not self.touch(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+                tmp.write(zlib.compress(data, 6))
+            os.replace(tmp.name, path)
+        if link:
+            self.link_index.set(link, ref)
+        return ref
+
+    def touch(self, path) -> bool:
+        # prune() goes by mtime, so a page that is stored again or reused counts as new
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def has(self, ref) -> bool:
+        return bool(ref) and os.path.exists(self.get_path(ref))
+
+    def get(self, ref) -> str | None:
+        if not ref:
+            return None
+        try:
+            with open(self.get_path(ref), "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return zlib.decompress(mapped).decode("utf-8")
+        except (OSError, ValueError, zlib.error) as e:
+            logger.error(f"Error reading stored page {ref}: {e}")
+            return None
+
+    def get_ref_for_link(self, link) -> str | None:
+        ref = self.link_index.get(link)
+        return ref if ref and self.touch(self.get_path(ref)) else None
+
+    def prune(self):
+        # Removes pages that were neither stored nor reused for ttl_seconds
+        if not self.ttl_seconds or not os.path.isdir(self.directory):
+            return
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".z") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        if removed:
+            logger.info(f"Removed {removed} expired pages from the HTML store.")
+
+
+html_store = HtmlStore(os.path.join(settings.cache_dir, "html"), settings.html_store_ttl_seconds)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from loguru import logger
+
+from config import settings
+from pipeline import process_companies
+from schemas import CompanyRequest
+
+
+class JobStore:
+    """Jobs and their per-company progress, in SQLite so they survive restarts.
+
+    The "memory" backend uses an in-memory SQLite database with the same code.
+    """
+
+    def __init__(self, path):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, progress TEXT NOT NULL, "
+            "created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+
+    def create(self, request: CompanyRequest) -> str:
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        progress = {company: {"stage": "queued", "counts": {}} for company in request.companies}
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO jobs (id, status, request, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, "queued", request.model_dump_json(), json.dumps(progress), now, now),
+            )
+        return job_id
+
+    def get(self, job_id) -> dict | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id, status, request, progress, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "request": json.loads(row[2]),
+            "companies": json.loads(row[3]),
+            "created_at": row[4],
+            "updated_at": row[5],
+        }
+
+    def set_status(self, job_id, status):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, datetime.now().isoformat(), job_id)
+            )
+
+    def set_progress(self, job_id, progress: dict):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(progress), datetime.now().isoformat(), job_id),
+            )
+
+    def get_unfinished(self) -> list[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class JobRunner:
+    """Runs submitted /process-news requests on a fixed pool of worker tasks."""
+
+    def __init__(self, store):
+        self.store = store
+        self.queue: asyncio.Queue | None = None
+        self.workers: list[asyncio.Task] = []
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        # Jobs interrupted by a restart run again, stored results are skipped by the link filter
+        for job_id in self.store.get_unfinished():
+            self.store.set_status(job_id, "queued")
+            self.queue.put_nowait(job_id)
+        self.workers = [asyncio.create_task(self.work()) for _ in range(settings.job_workers)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, request: CompanyRequest) -> str:
+        job_id = self.store.create(request)
+        self.queue.put_nowait(job_id)
+        return job_id
+
+    async def work(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self.run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                self.store.set_status(job_id, "failed")
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job_id):
+        job = self.store.get(job_id)
+        request = CompanyRequest(**job["request"])
+        self.store.set_status(job_id, "running")
+        logger.info(f"Running job {job_id} for {request.companies}")
+
+        # Progress changes on every article, it is kept here and written at most once per interval
+        progress = job["companies"]
+        changed = asyncio.Event()
+
+        def on_progress(company, stage, counts):
+            entry = progress.setdefault(company, {"stage": "queued", "counts": {}})
+            entry["stage"] = stage
+            if counts:
+                entry["counts"] = dict(counts)
+            changed.set()
+
+        async def save_progress():
+            # Serialized on the event loop, so the worker thread never sees progress change mid-write
+            snapshot = json.loads(json.dumps(progress))
+            await asyncio.to_thread(self.store.set_progress, job_id, snapshot)
+
+        async def save_progress_periodically():
+            while True:
+                await changed.wait()
+                changed.clear()
+                await save_progress()
+                await asyncio.sleep(settings.job_progress_interval_seconds)
+
+        saver = asyncio.create_task(save_progress_periodically())
+        try:
+            errors = await process_companies(request.companies, request.number_of_days, on_progress, request.refresh)
+        finally:
+            saver.cancel()
+            await asyncio.gather(saver, return_exceptions=True)
+            await save_progress()
+        if not errors:
+            status = "completed"
+        elif len(errors) < len(request.companies):
+            status = "completed_with_errors"
+        else:
+            status = "failed"
+        self.store.set_status(job_id, status)
+        logger.info(f"Job {job_id} {status}.")
+
+
+job_store = JobStore(":memory:" if settings.job_store_backend == "memory" else os.path.join(settings.cache_dir, "jobs.sqlite3"))
+job_runner = JobRunner(job_store)
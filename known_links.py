@@ -0,0 +1,64 @@
+import threading
+from typing import List
+from loguru import logger
+from sqlalchemy.sql import select
+
+from db import Sessions, NewsModel
+from schemas import LinkTagsSchema
+from web_search import canonicalize_url
+
+
+class KnownLinks:
+    """In-process view of the links already stored in each configured database.
+
+    The sets only ever hold links that were seen in a database, they are filled
+    lazily from bulk lookups of candidate links and from our own writes.
+    """
+
+    def __init__(self, sessions, chunk_size=500):
+        self.sessions = sessions
+        self.chunk_size = chunk_size
+        self.links = [set() for _ in sessions]
+        self.lock = threading.Lock()
+
+    def load(self, links):
+        for index, s in enumerate(self.sessions):
+            with self.lock:
+                unknown = [link for link in set(links) if link not in self.links[index]]
+            if not unknown:
+                continue
+            # For a while links were stored in their canonical form, a row in that form counts too
+            variants = {}
+            for link in unknown:
+                variants.setdefault(canonicalize_url(link), link)
+                variants[link] = link
+            candidates = list(variants)
+            found = set()
+            with s() as session:
+                for i in range(0, len(candidates), self.chunk_size):
+                    chunk = candidates[i:i + self.chunk_size]
+                    found.update(
+                        variants[link]
+                        for link in session.scalars(select(NewsModel.link).where(NewsModel.link.in_(chunk)))
+                    )
+            with self.lock:
+                self.links[index].update(found)
+
+    def add(self, index, links):
+        with self.lock:
+            self.links[index].update(links)
+
+    def is_stored_everywhere(self, link):
+        with self.lock:
+            return all(link in links for links in self.links)
+
+    def filter_new(self, links_tags: List[LinkTagsSchema]) -> List[LinkTagsSchema]:
+        # A link is only skipped when every database already has it, so a
+        # database that missed it earlier still gets it on the next run
+        self.load([link_tags.link for link_tags in links_tags])
+        new_links_tags = [link_tags for link_tags in links_tags if not self.is_stored_everywhere(link_tags.link)]
+        logger.info(f"Skipping {len(links_tags) - len(new_links_tags)} already stored links, {len(new_links_tags)} new.")
+        return new_links_tags
+
+
+known_links = KnownLinks(Sessions)
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+from loguru import logger
+from sqlalchemy.sql import select
+
+from simhash import SimHashIndex, to_unsigned
+
+
+# Marks fingerprints of stored articles in the index
+STORED = object()
+
+
+class NearDuplicateFilter:
+    """Keeps the first article of each group of near-duplicates seen in one company run.
+
+    Articles close to an already stored one are dropped. The tags of dropped
+    copies are merged into their representative, see tags_for.
+    """
+
+    def __init__(self, max_distance, stored_fingerprints=()):
+        self.index = SimHashIndex(max_distance)
+        for fingerprint in stored_fingerprints:
+            self.index.add(fingerprint, STORED)
+        self.tags = {}
+        self.fingerprints = {}
+        self.dropped = 0
+
+    def keep(self, article) -> bool:
+        link = str(article.link)
+        if article.fingerprint is None:
+            return True
+        match = self.index.find(article.fingerprint)
+        if match is None:
+            self.index.add(article.fingerprint, link)
+            self.tags[link] = list(article.tags)
+            self.fingerprints[link] = article.fingerprint
+            return True
+        self.dropped += 1
+        if match is STORED:
+            logger.info(f"Near-duplicate of a stored article. URL: {link}")
+        else:
+            logger.info(f"Near-duplicate of {match}. URL: {link}")
+            self.tags[match].extend(tag for tag in article.tags if tag not in self.tags[match])
+        return False
+
+    def tags_for(self, link, tags) -> list[str]:
+        return self.tags.get(link, tags)
+
+    def fingerprint_for(self, link) -> int | None:
+        return self.fingerprints.get(link)
+
+
+def load_stored_fingerprints(session_factory, company, lookback_days) -> list[int]:
+    from db import NewsModel
+
+    since = date.today() - timedelta(days=lookback_days)
+    with session_factory() as session:
+        rows = session.scalars(
+            select(NewsModel.fingerprint).where(
+                NewsModel.company_name == company,
+                NewsModel.published_date >= since,
+                NewsModel.fingerprint.is_not(None),
+            )
+        )
+        return [to_unsigned(fingerprint) for fingerprint in rows]
@@ -0,0 +1,147 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import tuple_
+from sqlalchemy.sql import select
+
+from config import settings
+from db import Sessions, NewsModel, TagModel, NewsTagsModel
+from schemas import NewsItemSchema, NewsPageSchema
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(published_date, news_id) -> str:
+    payload = json.dumps([published_date.isoformat(), news_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor) -> tuple[date, int]:
+    try:
+        published_date, news_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return date.fromisoformat(published_date), int(news_id)
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+class NewsPageCache:
+    """Small in-process LRU of news pages, grouped by company so one company's pages can be dropped.
+
+    Pages of queries without a company are under None and are dropped by every invalidation.
+    """
+
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, page = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return page
+
+    def set(self, key, page):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, page)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, company):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] in (company, None)]:
+                del self.entries[key]
+
+
+class NewsReader:
+    """Pages of stored news, newest first, read from the first configured database.
+
+    Pagination is keyset based on (published_date, id) so every page is an index
+    range scan no matter how deep it is.
+    """
+
+    def __init__(self, session_factory, cache=None):
+        self.session_factory = session_factory
+        self.cache = cache
+
+    def list_news(self, company=None, from_date=None, to_date=None, tag=None, limit=None, cursor=None) -> NewsPageSchema:
+        limit = max(1, min(limit or settings.news_page_size, settings.news_page_max_size))
+        key = (company, from_date, to_date, tag, limit, cursor)
+        if self.cache is not None:
+            page = self.cache.get(key)
+            if page is not None:
+                return page
+        page = self.query(company, from_date, to_date, tag, limit, cursor)
+        if self.cache is not None:
+            self.cache.set(key, page)
+        return page
+
+    def query(self, company, from_date, to_date, tag, limit, cursor) -> NewsPageSchema:
+        statement = select(NewsModel).where(NewsModel.published_date.is_not(None))
+        if company:
+            statement = statement.where(NewsModel.company_name == company)
+        if from_date:
+            statement = statement.where(NewsModel.published_date >= from_date)
+        if to_date:
+            statement = statement.where(NewsModel.published_date <= to_date)
+        if tag:
+            tagged = (
+                select(NewsTagsModel.news_id)
+                .join(TagModel, TagModel.id == NewsTagsModel.tag_id)
+                .where(TagModel.name == tag.strip().lower())
+            )
+            statement = statement.where(NewsModel.id.in_(tagged))
+        if cursor:
+            published_date, news_id = decode_cursor(cursor)
+            statement = statement.where(tuple_(NewsModel.published_date, NewsModel.id) < tuple_(published_date, news_id))
+        # One extra row tells whether there is a next page
+        statement = statement.order_by(NewsModel.published_date.desc(), NewsModel.id.desc()).limit(limit + 1)
+
+        with self.session_factory() as session:
+            rows = list(session.scalars(statement))
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            tags = {}
+            if rows:
+                tag_rows = session.execute(
+                    select(NewsTagsModel.news_id, TagModel.name)
+                    .join(TagModel, TagModel.id == NewsTagsModel.tag_id)
+                    .where(NewsTagsModel.news_id.in_([row.id for row in rows]))
+                ).all()
+                for news_id, name in tag_rows:
+                    tags.setdefault(news_id, []).append(name)
+
+        items = [
+            NewsItemSchema(
+                id=row.id,
+                link=row.link,
+                title=row.title,
+                summary=row.summary,
+                classification_score=row.classification_score,
+                published_date=row.published_date,
+                company_name=row.company_name,
+                tags=sorted(tags.get(row.id, [])),
+            )
+            for row in rows
+        ]
+        next_cursor = encode_cursor(rows[-1].published_date, rows[-1].id) if has_more else None
+        return NewsPageSchema(items=items, next_cursor=next_cursor)
+
+
+news_page_cache = (
+    NewsPageCache(settings.news_cache_ttl_seconds, settings.news_cache_max_entries) if settings.news_cache_enabled else None
+)
+news_reader = NewsReader(Sessions[0], news_page_cache)
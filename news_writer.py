@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import List
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.sql import select
+
+from config import settings
+from db import Sessions, NewsModel, TagModel, NewsTagsModel
+from known_links import known_links
+from simhash import to_signed
+from news_reader import news_page_cache
+from schemas import NewsAggregatorResultSchema
+
+
+def insert_ignore(session, model, rows, unique_column, returning=(), marker_column=None) -> list:
+    """Inserts the rows whose unique_column value is not stored yet.
+
+    Returns the returning columns of the rows that were inserted. Databases without
+    RETURNING tell the inserted rows from rows other writers stored meanwhile by
+    marker_column, which has to hold the same value in every row.
+    """
+    dialect = session.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_ = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert_(model).on_conflict_do_nothing(index_elements=[unique_column])
+        if returning:
+            return session.execute(statement.returning(*returning), rows).all()
+        session.execute(statement, rows)
+        return []
+
+    # Without RETURNING the stored rows are looked up before and the inserted ones after
+    column = getattr(model, unique_column)
+    stored = set(session.scalars(select(column).where(column.in_([row[unique_column] for row in rows]))))
+    new_rows = [row for row in rows if row[unique_column] not in stored]
+    if not new_rows:
+        return []
+    if dialect == "mysql":
+        # Skips rows other writers stored since the lookup
+        session.execute(mysql.insert(model).prefix_with("IGNORE"), new_rows)
+    else:
+        session.execute(insert(model), new_rows)
+    if not returning:
+        return []
+    statement = select(*returning).where(column.in_([row[unique_column] for row in new_rows]))
+    if marker_column:
+        statement = statement.where(getattr(model, marker_column) == new_rows[0][marker_column])
+    return session.execute(statement).all()
+
+
+def normalize_tag(tag_name):
+    return tag_name.strip().lower()
+
+
+class NewsWriter:
+    """Writes summaries to every configured database with a handful of statements per database.
+
+    Tag ids are cached per database once a transaction that created or read them commits.
+    Databases are written concurrently, each from its own worker thread, and the outcome
+    of the last write to each database is kept in status.
+    """
+
+    def __init__(self, sessions, known_links, news_page_cache=None):
+        self.sessions = sessions
+        self.known_links = known_links
+        # Pages served by the read API come from the first database
+        self.news_page_cache = news_page_cache
+        self.tag_ids = [dict() for _ in sessions]
+        self.status = [{"database": s.kw["bind"].url.database, "success": None} for s in sessions]
+        self.background_tasks = set()
+        self.lock = threading.Lock()
+
+    async def write_all(self, summaries: List[NewsAggregatorResultSchema], company, mode=None) -> List[tuple[bool, str | None]]:
+        """Returns (success, error) of every write that was awaited, the first one is the primary database's."""
+        mode = mode or settings.db_write_mode
+        if mode == "primary" and len(self.sessions) > 1:
+            primary = await self.write_async(0, summaries, company)
+            for index in range(1, len(self.sessions)):
+                # Keep a reference, the event loop only holds weak ones to tasks
+                task = asyncio.create_task(self.write_async(index, summaries, company))
+                self.background_tasks.add(task)
+                task.add_done_callback(self.background_tasks.discard)
+            return [primary]
+        return list(await asyncio.gather(*[self.write_async(index, summaries, company) for index in range(len(self.sessions))]))
+
+    async def write_async(self, index, summaries, company) -> tuple[bool, str | None]:
+        return await asyncio.to_thread(self.write, index, summaries, company)
+
+    async def drain(self):
+        # Waits for background replication writes
+        if self.background_tasks:
+            await asyncio.gather(*list(self.background_tasks), return_exceptions=True)
+
+    def write(self, index, summaries: List[NewsAggregatorResultSchema], company) -> tuple[bool, str | None]:
+        started = time.perf_counter()
+        success, error = self.write_database(index, summaries, company)
+        self.status[index] = {
+            "database": self.status[index]["database"],
+            "success": success,
+            "error": error,
+            "finished_at": datetime.now().isoformat(),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        if success:
+            self.known_links.add(index, [str(summary.link) for summary in summaries])
+        return success, error
+
+    def write_database(self, index, summaries: List[NewsAggregatorResultSchema], company) -> tuple[bool, str | None]:
+        summaries_by_link = {str(summary.link): summary for summary in summaries}
+        if not summaries_by_link:
+            return True, None
+        session_factory = self.sessions[index]
+        try:
+            with session_factory() as session, session.begin():
+                database = session.bind.url.database
+                tag_ids = self.resolve_tags(index, session, summaries_by_link.values())
+
+                # Also marks the rows of this write; whole seconds, as MySQL DATETIME keeps no more
+                created_at = datetime.now().replace(microsecond=0)
+                news_rows = [
+                    {
+                        "classification_score": summary.classification_score,
+                        "title": summary.title,
+                        "summary": summary.summary,
+                        "link": link,
+                        "published_date": summary.published_date,
+                        "company_name": company,
+                        "created_at": created_at,
+                        "fingerprint": to_signed(summary.fingerprint) if summary.fingerprint is not None else None,
+                    }
+                    for link, summary in summaries_by_link.items()
+                ]
+                inserted = insert_ignore(
+                    session, NewsModel, news_rows, "link", (NewsModel.id, NewsModel.link), marker_column="created_at"
+                )
+
+                news_tag_rows = []
+                for news_id, link in inserted:
+                    names = {normalize_tag(tag_name) for tag_name in summaries_by_link[link].tags}
+                    news_tag_rows.extend({"news_id": news_id, "tag_id": tag_ids[name]} for name in names if name)
+                if news_tag_rows:
+                    session.execute(insert(NewsTagsModel), news_tag_rows)
+            with self.lock:
+                self.tag_ids[index].update(tag_ids)
+            if index == 0 and inserted and self.news_page_cache is not None:
+                self.news_page_cache.invalidate(company)
+            logger.info(
+                "Added {inserted} of {total} summaries to database {database}.".format(
+                    inserted=len(inserted), total=len(news_rows), database=database
+                )
+            )
+            return True, None
+        except Exception as e:
+            logger.error("Database error: {error}.".format(error=str(e)))
+            return False, str(e)
+
+    def resolve_tags(self, index, session, summaries) -> dict:
+        names = {normalize_tag(tag_name) for summary in summaries for tag_name in summary.tags}
+        names.discard("")
+        with self.lock:
+            tag_ids = {name: self.tag_ids[index][name] for name in names if name in self.tag_ids[index]}
+        missing = sorted(names - tag_ids.keys())
+        if missing:
+            insert_ignore(session, TagModel, [{"name": name} for name in missing], "name")
+            rows = session.execute(select(TagModel.name, TagModel.id).where(TagModel.name.in_(missing))).all()
+            tag_ids.update({name: tag_id for name, tag_id in rows})
+        return tag_ids
+
+
+news_writer = NewsWriter(Sessions, known_links, news_page_cache)
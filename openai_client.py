@@ -1,26 +1,72 @@
-from openai import OpenAI
+import hashlib
+import json
+import os
 
+from openai import AsyncOpenAI
+
+from cache import SqliteCache
 from config import settings
 
 
+llm_cache = (
+    SqliteCache(
+        os.path.join(settings.cache_dir, "llm_cache.sqlite3"),
+        "llm_responses",
+        settings.llm_cache_ttl_seconds,
+        settings.llm_cache_max_entries,
+    )
+    if settings.llm_cache_enabled
+    else None
+)
+
+
+# One connection pool for every company processed by this process, closed in the app lifespan
+client = AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url)
+
+
+async def close_openai_client():
+    await client.close()
+
+
+def get_cache_key(model, messages, response_format):
+    payload = json.dumps(
+        {"model": model, "messages": messages, "response_format": response_format.model_json_schema()},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class OpenAiClient:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        self.client = client
         self.model = settings.openai_model
 
-    def query_gpt(self, messages, response_format):
-        completion = self.client.beta.chat.completions.parse(
+    async def query_gpt(self, messages, response_format):
+        if llm_cache is None:
+            return await self.query_api(messages, response_format)
+
+        key = get_cache_key(self.model, messages, response_format)
+        cached = await llm_cache.get_async(key)
+        if cached is not None:
+            return response_format.model_validate_json(cached)
+
+        parsed = await self.query_api(messages, response_format)
+        if isinstance(parsed, response_format):
+            await llm_cache.set_async(key, parsed.model_dump_json())
+        return parsed
+
+    async def query_api(self, messages, response_format):
+        completion = await self.client.beta.chat.completions.parse(
             model=self.model, messages=messages, response_format=response_format
         )
         return completion.choices[0].message.parsed
     
-class OpenAiClientForDates:
+class OpenAiClientForDates(OpenAiClient):
     def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        super().__init__()
         self.model = settings.openai_model_dates
 
-    def query_gpt(self, messages, response_format):
-        completion = self.client.beta.chat.completions.parse(
-            model=self.model, messages=messages, response_format=response_format
-        )
-        return completion.choices[0].message.parsed
+
+openai_client = OpenAiClient()
+openai_client_for_dates = OpenAiClientForDates()
@@ -0,0 +1,330 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+import httpx
+from loguru import logger
+
+from agents import news_question_generator_agent, Agent
+from analysis_manager import create_dynamic_agents, analyze_and_summarize_article, limited_query
+from article_fetcher import ArticleFetcher
+from artefact_store import artefact_store
+from classification_manager import get_classification_score_of_company_based_news
+from config import settings
+from date_extractor import date_source_counts
+from db import Sessions
+from downloader import ArticleDownloader
+from known_links import known_links
+from near_duplicates import NearDuplicateFilter, load_stored_fingerprints
+from prefilter import LexicalPrefilter, prefilter_counts
+from news_writer import news_writer
+from openai_client import openai_client, openai_client_for_dates, llm_cache
+from schemas import QuestionsThresholdSchema, DynamicAgentsSchema, AgentModelOpenAiResponseSchema
+from web_search import GoogleSearchClient
+
+
+# Marks the end of a stage's input
+DONE = object()
+
+
+async def run_stage(name, inbox, outbox, handler, workers, counts, batch_size=1, batch_wait_seconds=0.0, on_progress=None):
+    """Runs handler on every item of inbox with a fixed number of workers.
+
+    Non-None results are put on outbox, which gets DONE once every worker has seen
+    DONE on inbox. With batch_size > 1 one collector groups items into batches of up
+    to batch_size, waiting at most batch_wait_seconds after the first item of a batch
+    for the rest, and the workers run handler on whole batches; it gets and returns lists.
+    """
+
+    async def emit(results):
+        for result in results:
+            if result is not None:
+                counts[name] = counts.get(name, 0) + 1
+                if on_progress is not None:
+                    on_progress(name, counts)
+                if outbox is not None:
+                    await outbox.put(result)
+
+    async def work():
+        while True:
+            item = await inbox.get()
+            if item is DONE:
+                # Put it back for the other workers
+                await inbox.put(DONE)
+                return
+            try:
+                result = await handler(item)
+            except Exception as e:
+                logger.error(f"Stage {name} failed: {e}")
+                continue
+            await emit([result])
+
+    async def collect(batches):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            item = await inbox.get()
+            if item is DONE:
+                break
+            items = [item]
+            deadline = loop.time() + batch_wait_seconds
+            while len(items) < batch_size:
+                try:
+                    item = inbox.get_nowait() if not inbox.empty() else await asyncio.wait_for(inbox.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if item is DONE:
+                    done = True
+                    break
+                items.append(item)
+            await batches.put(items)
+        for _ in range(workers):
+            await batches.put(DONE)
+
+    async def work_batches(batches):
+        while (items := await batches.get()) is not DONE:
+            try:
+                results = await handler(items)
+            except Exception as e:
+                logger.error(f"Stage {name} failed: {e}")
+                continue
+            await emit(results)
+
+    workers = max(1, workers)
+    if batch_size > 1:
+        batches = asyncio.Queue(maxsize=workers)
+        await asyncio.gather(collect(batches), *[work_batches(batches) for _ in range(workers)])
+    else:
+        await asyncio.gather(*[work() for _ in range(workers)])
+    if outbox is not None:
+        await outbox.put(DONE)
+
+
+async def drain(queue):
+    items = []
+    while (item := await queue.get()) is not DONE:
+        items.append(item)
+    return items
+
+
+async def process_companies(companies, number_of_days, on_progress=None, refresh=False) -> dict:
+    """Processes companies concurrently and returns the exception of each failed one.
+
+    on_progress(company, stage, counts) is called as each company moves through
+    the pipeline. A failing company does not stop the others.
+    """
+    semaphore = asyncio.Semaphore(settings.company_concurrency)
+    errors = {}
+
+    async def run(company, http_client, downloader):
+        async with semaphore:
+            progress = (lambda stage, counts: on_progress(company, stage, counts)) if on_progress else None
+            try:
+                await process_company(company, number_of_days, http_client, downloader, progress, refresh)
+            except Exception as e:
+                logger.error(f"Error processing news for {company}: {e}")
+                errors[company] = e
+                if on_progress:
+                    on_progress(company, "failed", {"error": str(e)})
+            else:
+                if on_progress:
+                    on_progress(company, "done", {})
+
+    # One search connection pool and one article downloader for every company
+    async with httpx.AsyncClient(timeout=settings.google_search_timeout_seconds) as http_client, ArticleDownloader() as downloader:
+        await asyncio.gather(*[run(company, http_client, downloader) for company in companies])
+        logger.info(f"Article downloads: {downloader.stats}")
+    if llm_cache is not None:
+        logger.info(f"LLM cache stats: {llm_cache.stats()}")
+    logger.info(f"Published date sources: {dict(date_source_counts)}")
+    logger.info(f"Lexical prefilter: {dict(prefilter_counts)}")
+    return errors
+
+
+async def process_company(company, number_of_days, http_client, downloader, progress=None, refresh=False):
+    """Searches, processes and stores the news of one company.
+
+    Articles flow one by one through bounded queues: download -> extract ->
+    near-duplicate filter -> lexical prefilter and classify -> published date. Creating the dynamic agents needs every relevant
+    article and is the only barrier; after it summaries are stored in small
+    batches as they are produced.
+    """
+    progress = progress or (lambda stage, counts: None)
+    progress("questions", {})
+    logger.info(f"Getting news for: {company}")
+
+    async def generate_questions():
+        logger.info(f"Getting search terms and threshold")
+        prompt = news_question_generator_agent.for_company(company).prompt(company)
+        return await openai_client.query_gpt(prompt, QuestionsThresholdSchema)
+
+    output = await artefact_store.get_or_create(company, "questions", QuestionsThresholdSchema, generate_questions, refresh)
+    logger.success(f"Number of questions: {len(output.questions)}, Threshold: {output.threshold}")
+
+    progress("search", {})
+    google_search_client = GoogleSearchClient(company, number_of_days, openai_client, http_client, refresh)
+    logger.info("Google search client created.")
+
+    links_tags = await google_search_client.get_news_links()
+    links_tags = await asyncio.to_thread(known_links.filter_new, links_tags)
+    if not links_tags:
+        logger.info(f"No new links for {company}.")
+        return
+
+    article_fetcher = ArticleFetcher(links_tags, openai_client_for_dates, downloader)
+    counts = {"links": len(links_tags)}
+    progress("articles", counts)
+    stored_fingerprints = []
+    if settings.near_duplicate_enabled:
+        stored_fingerprints = await asyncio.to_thread(
+            load_stored_fingerprints, Sessions[0], company, settings.near_duplicate_lookback_days
+        )
+    prefilter = LexicalPrefilter(
+        company, output.questions, settings.company_aliases.get(company, []),
+        settings.prefilter_min_score, settings.prefilter_shadow_rate,
+    )
+    near_duplicates = NearDuplicateFilter(settings.near_duplicate_max_distance, stored_fingerprints)
+    queue_size = settings.pipeline_queue_size
+    links, pages, articles, unique, relevant, dated = (asyncio.Queue(maxsize=queue_size) for _ in range(6))
+
+    async def feed():
+        for link_tags in links_tags:
+            await links.put(link_tags)
+        await links.put(DONE)
+
+    async def download(link_tags):
+        html_ref = await article_fetcher.download_article(link_tags)
+        return (link_tags, html_ref) if html_ref else None
+
+    # Set when extraction can not run at all; the remaining pages are skipped and the company fails
+    extraction_error = None
+
+    async def parse(page):
+        nonlocal extraction_error
+        if extraction_error is not None:
+            return None
+        try:
+            return await article_fetcher.parse_article(*page)
+        except BrokenProcessPool as e:
+            extraction_error = e
+            return None
+
+    async def deduplicate(article):
+        return article if not settings.near_duplicate_enabled or near_duplicates.keep(article) else None
+
+    async def classify(batch):
+        shadowed = set()
+        if settings.prefilter_enabled:
+            kept = []
+            for article in batch:
+                if prefilter.keep(article):
+                    kept.append(article)
+                elif prefilter.shadow():
+                    kept.append(article)
+                    shadowed.add(str(article.link))
+                else:
+                    counts["pruned"] = counts.get("pruned", 0) + 1
+            batch = kept
+        if not batch:
+            return []
+        results = await get_classification_score_of_company_based_news(batch, openai_client, company, output)
+        for article, result in zip(batch, results):
+            if str(article.link) in shadowed:
+                relevant = bool(result and result.score >= output.threshold)
+                prefilter.record_shadow(article, relevant)
+                # The LLM decides for the sampled articles; irrelevant ones count as pruned
+                if not relevant:
+                    counts["pruned"] = counts.get("pruned", 0) + 1
+        return [result for result in results if result and result.score >= output.threshold]
+
+    async def classify_one(article):
+        results = await classify([article])
+        return results[0] if results else None
+
+    classification_batch_size = settings.classification_batch_size
+    # The only barrier: dynamic agents are created from every relevant article
+    collected = asyncio.ensure_future(drain(dated))
+    await asyncio.gather(
+        feed(),
+        run_stage("downloaded", links, pages, download, settings.article_download_concurrency, counts, on_progress=progress),
+        run_stage(
+            "extracted", pages, articles, parse, settings.extraction_workers or os.cpu_count() or 1, counts,
+            on_progress=progress,
+        ),
+        # One worker: the first copy of a story to arrive is its representative
+        run_stage("unique", articles, unique, deduplicate, 1, counts, on_progress=progress),
+        run_stage(
+            "relevant", unique, relevant, classify if classification_batch_size > 1 else classify_one,
+            settings.classification_concurrency, counts, batch_size=classification_batch_size,
+            batch_wait_seconds=settings.classification_batch_wait_seconds, on_progress=progress,
+        ),
+        run_stage(
+            "dated", relevant, dated, article_fetcher.resolve_published_date, settings.date_resolution_concurrency, counts,
+            on_progress=progress,
+        ),
+        collected,
+    )
+    if extraction_error is not None:
+        raise RuntimeError(f"Article extraction failed: {extraction_error!r}")
+    company_based_articles_with_dates = sorted(collected.result(), key=lambda x: x.score, reverse=True)
+    counts["near_duplicates"] = near_duplicates.dropped
+    logger.info(f"Pipeline counts for {company}: {counts}")
+    if not company_based_articles_with_dates:
+        logger.info(f"No relevant articles for {company}.")
+        return
+
+    progress("agents", counts)
+
+    async def generate_dynamic_agents():
+        agents = await create_dynamic_agents(company_based_articles_with_dates, openai_client)
+        return DynamicAgentsSchema(
+            agents=[AgentModelOpenAiResponseSchema(name=agent.name, role=agent.role, function=agent.function) for agent in agents]
+        )
+
+    stored_agents = await artefact_store.get_or_create(company, "dynamic_agents", DynamicAgentsSchema, generate_dynamic_agents, refresh)
+    dynamic_agents = [Agent(agent.name, agent.role, agent.function) for agent in stored_agents.agents]
+    progress("analysis", counts)
+
+    to_analyze, summaries = asyncio.Queue(), asyncio.Queue(maxsize=queue_size)
+    for article in company_based_articles_with_dates:
+        to_analyze.put_nowait(article)
+    to_analyze.put_nowait(DONE)
+
+    async def analyze(article):
+        return await analyze_and_summarize_article(article, dynamic_agents, limited_query)
+
+    write_errors = []
+
+    async def persist():
+        batch = []
+        while True:
+            summary = await summaries.get()
+            if summary is not DONE:
+                link = str(summary.link)
+                # Tags of the dropped near-duplicates are stored with their representative
+                batch.append(summary.model_copy(update={
+                    "tags": near_duplicates.tags_for(link, summary.tags),
+                    "fingerprint": near_duplicates.fingerprint_for(link),
+                }))
+            # Flush when the batch is full, when nothing else is ready yet, or at the end
+            if batch and (summary is DONE or len(batch) >= settings.persist_batch_size or summaries.empty()):
+                # Only the first database's write decides, it is the one the read API serves
+                success, error = (await news_writer.write_all(batch, company))[0]
+                if success:
+                    counts["persisted"] = counts.get("persisted", 0) + len(batch)
+                    progress("persisted", counts)
+                else:
+                    counts["persist_failed"] = counts.get("persist_failed", 0) + len(batch)
+                    write_errors.append(error)
+                batch = []
+            if summary is DONE:
+                return
+
+    await asyncio.gather(
+        run_stage("summarized", to_analyze, summaries, analyze, settings.analysis_concurrency, counts, on_progress=progress),
+        persist(),
+    )
+    logger.info(f"Pipeline counts for {company}: {counts}")
+    if write_errors:
+        raise RuntimeError(
+            f"{counts['persist_failed']} of {counts['summarized']} summaries were not stored: {write_errors[-1]}"
+        )
@@ -0,0 +1,105 @@
+import math
+import random
+import re
+from collections import Counter
+from loguru import logger
+
+
+# Articles below the cutoff, the shadow-classified share of them and how many of those the LLM found relevant
+prefilter_counts = Counter()
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a about above after again against all am an and any are as at be because been before being below between both "
+    "but by can could did do does doing down during each few for from further had has have having he her here hers "
+    "him his how i if in into is it its itself just may me might more most must my no nor not now of off on once only "
+    "or other our out over own same she should so some such than that the their them then there these they this those "
+    "through to too under until up very was we were what when where which while who whom why will with would you your "
+    "company company's news article articles related relevant mention mentions mentioned does did any specific".split()
+)
+COMPANY_SUFFIXES = frozenset(
+    "inc incorporated corp corporation co company ltd limited plc llc lp group holdings holding sa ag nv se".split()
+)
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text) -> list[str]:
+    return WORD_RE.findall(text.lower())
+
+
+def get_company_aliases(company, aliases=()) -> list[str]:
+    # The name as given, the name without legal suffixes, and any configured aliases
+    names = [company, *aliases]
+    tokens = tokenize(company)
+    while tokens and tokens[-1] in COMPANY_SUFFIXES:
+        tokens.pop()
+    if tokens:
+        names.append(" ".join(tokens))
+    return sorted({" ".join(tokenize(name)) for name in names if tokenize(name)})
+
+
+class LexicalPrefilter:
+    """Cheap relevance check run before the LLM classifier.
+
+    Articles mentioning the company or one of its aliases are always kept.
+    Others are scored with BM25 against the classification questions, the
+    score being normalized to 0..1 by the best score the query could get.
+    Document frequencies and the average length come from the articles seen
+    so far in the run, as articles arrive one at a time. Articles scoring
+    below min_score are pruned; a shadow_rate share of them is still sent to
+    the LLM so disagreements can be counted.
+    """
+
+    def __init__(self, company, questions, aliases=(), min_score=0.05, shadow_rate=0.1):
+        self.aliases = get_company_aliases(company, aliases)
+        alias_terms = {token for alias in self.aliases for token in alias.split()}
+        self.terms = sorted(
+            {token for question in questions for token in tokenize(question) if token not in STOPWORDS and len(token) > 2}
+            | alias_terms
+        )
+        self.min_score = min_score
+        self.shadow_rate = shadow_rate
+        self.document_frequency = Counter()
+        self.documents = 0
+        self.total_length = 0
+
+    def mentions_company(self, tokens) -> bool:
+        text = f" {' '.join(tokens)} "
+        return any(f" {alias} " in text for alias in self.aliases)
+
+    def score(self, tokens) -> float:
+        frequencies = Counter(tokens)
+        self.documents += 1
+        self.total_length += len(tokens)
+        self.document_frequency.update(term for term in self.terms if term in frequencies)
+        average_length = self.total_length / self.documents
+        length_norm = K1 * (1 - B + B * len(tokens) / max(average_length, 1))
+        score, best = 0.0, 0.0
+        for term in self.terms:
+            df = self.document_frequency[term]
+            idf = math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+            tf = frequencies[term]
+            score += idf * tf * (K1 + 1) / (tf + length_norm)
+            best += idf * (K1 + 1)
+        return score / best if best else 1.0
+
+    def keep(self, article) -> bool:
+        tokens = tokenize(f"{article.title} {article.text}")
+        # Scored even when the company is mentioned, so frequencies cover every article
+        score = self.score(tokens)
+        if self.mentions_company(tokens) or score >= self.min_score:
+            return True
+        prefilter_counts["below_cutoff"] += 1
+        logger.info(f"Pruned by the lexical prefilter, score {score:.3f}. URL: {article.link}")
+        return False
+
+    def shadow(self) -> bool:
+        return random.random() < self.shadow_rate
+
+    def record_shadow(self, article, relevant):
+        prefilter_counts["shadow_classified"] += 1
+        if relevant:
+            prefilter_counts["shadow_disagreements"] += 1
+            logger.warning(f"Pruned article was relevant for the LLM. URL: {article.link}")
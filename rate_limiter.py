@@ -0,0 +1,34 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket shared by every coroutine in the process.
+
+    State is guarded by a thread lock and waiting happens with asyncio.sleep, so a
+    bucket is not tied to one event loop. A caller that finds the bucket empty
+    reserves the next token and sleeps until it is due.
+    """
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate_per_second
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
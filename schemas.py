@@ -6,6 +6,16 @@ from pydantic import BaseModel, HttpUrl, PlainSerializer
 class ClassificationScoreOpenAiResponseSchema(BaseModel):
     score: int
 
+
+class IndexedClassificationScoreOpenAiResponseSchema(BaseModel):
+    index: int
+    score: int
+
+
+class BatchClassificationScoreOpenAiResponseSchema(BaseModel):
+    scores: List[IndexedClassificationScoreOpenAiResponseSchema]
+
+
 class ArticlePublishedDateOpenAiResponseSchema(BaseModel):
     published_date: str
 
@@ -24,6 +34,10 @@ class AgentModelOpenAiResponseSchema(BaseModel):
     function: str
 
 
+class DynamicAgentsSchema(BaseModel):
+    agents: List[AgentModelOpenAiResponseSchema]
+
+
 class AnalysisResultOpenAiResponseSchema(BaseModel):
     analysis: str
 
@@ -37,8 +51,12 @@ class ArticleResponseSchema(BaseModel):
     tags: list[str]
     title: str
     text: str
-    html: str | None = None
+    # HtmlStore reference of the raw page
+    html_ref: str | None = None
     published_date: datetime | None = None
+    published_date_source: str | None = None
+    # SimHash of text
+    fingerprint: int | None = None
 
 
 class ArticleClassificationScoreSchema(BaseModel):
@@ -48,7 +66,8 @@ class ArticleClassificationScoreSchema(BaseModel):
     score: int
     text: str
     published_date: datetime | None = None
-    html: str | None = None
+    published_date_source: str | None = None
+    html_ref: str | None = None
 
 class ArticleWithPublishedDateResponseSchema(BaseModel):
     link: HttpUrl
@@ -83,6 +102,23 @@ class NewsAggregatorResultSchema(BaseModel):
     classification_score: int
     summary: str
     tags: list[str]
+    fingerprint: int | None = None
+
+
+class NewsItemSchema(BaseModel):
+    id: int
+    link: str
+    title: str | None
+    summary: str
+    classification_score: int
+    published_date: date
+    company_name: str | None
+    tags: list[str]
+
+
+class NewsPageSchema(BaseModel):
+    items: list[NewsItemSchema]
+    next_cursor: str | None
 
 
 class LinkTagsSchema(BaseModel):
@@ -93,6 +129,8 @@ class LinkTagsSchema(BaseModel):
 class CompanyRequest(BaseModel):
     companies: list[str]
     number_of_days: int
+    # Regenerate stored questions, search terms and dynamic agents
+    refresh: bool = False
 
 
 class SearchTermSchema(BaseModel):
@@ -0,0 +1,66 @@
+import hashlib
+import re
+
+
+# Imported by the extraction worker processes, so nothing here may import db
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+SHINGLE_SIZE = 3
+BITS = 64
+
+
+def simhash(text) -> int | None:
+    """64-bit SimHash of the word 3-shingles of text, None for texts without words."""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    weights = [0] * BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def to_signed(fingerprint) -> int:
+    # Stored in a signed BIGINT column
+    return fingerprint - (1 << BITS) if fingerprint >= 1 << (BITS - 1) else fingerprint
+
+
+def to_unsigned(fingerprint) -> int:
+    return fingerprint + (1 << BITS) if fingerprint < 0 else fingerprint
+
+
+class SimHashIndex:
+    """Finds fingerprints within max_distance bits of each other.
+
+    Fingerprints are split into max_distance + 1 bands of near equal width. Two
+    fingerprints that differ in at most max_distance bits agree on at least one
+    whole band, so only the fingerprints sharing a band with the query are
+    compared. Larger distances mean narrower bands and more candidates.
+    """
+
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        self.bands = []
+        shift = 0
+        for i in range(bands):
+            width = BITS // bands + (1 if i < BITS % bands else 0)
+            self.bands.append((shift, width))
+            shift += width
+        self.buckets = [dict() for _ in self.bands]
+
+    def band_keys(self, fingerprint):
+        return [fingerprint >> shift & ((1 << width) - 1) for shift, width in self.bands]
+
+    def find(self, fingerprint):
+        for buckets, key in zip(self.buckets, self.band_keys(fingerprint)):
+            for candidate, value in buckets.get(key, []):
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return value
+        return None
+
+    def add(self, fingerprint, value):
+        for buckets, key in zip(self.buckets, self.band_keys(fingerprint)):
+            buckets.setdefault(key, []).append((fingerprint, value))
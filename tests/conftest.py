@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Modules read their settings and open their caches and databases on import
+directory = tempfile.mkdtemp(prefix="news-tests-")
+os.environ.setdefault("DB_URL", f'["sqlite:///{os.path.join(directory, "news.sqlite3")}"]')
+os.environ.setdefault("CACHE_DIR", os.path.join(directory, "cache"))
+for name in ("OPENAI_API_KEY", "OPENAI_MODEL", "OPENAI_MODEL_DATES", "GOOGLE_SEARCH_API_KEY", "GOOGLE_SEARCH_ENGINE_ID"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("GOOGLE_SEARCH_NUMBER_OF_RETRIES", "0")
+os.environ.setdefault("CLASSIFICATION_SCORE_THRESHOLD", "3")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,86 @@
+import base64
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db import BaseModel, NewsModel, NewsTagsModel, TagModel
+from news_reader import InvalidCursorError, NewsReader, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def reader():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+    with session_factory() as session, session.begin():
+        tag = TagModel(name="earnings")
+        session.add(tag)
+        # Several rows per day, so pages end in the middle of a day
+        for i in range(1, 14):
+            news = NewsModel(
+                id=i, classification_score=5, summary=f"summary {i}", link=f"https://example.com/{i}",
+                published_date=date(2024, 1, 1 + i % 4), company_name="Acme" if i % 2 else "Globex",
+            )
+            session.add(news)
+            if i % 3 == 0:
+                session.flush()
+                session.add(NewsTagsModel(news_id=news.id, tag_id=tag.id))
+        session.add(NewsModel(id=99, classification_score=5, summary="undated", link="https://example.com/undated"))
+    return NewsReader(session_factory)
+
+
+def read_all(reader, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        page = reader.list_news(limit=limit, cursor=cursor, **filters)
+        ids.extend(item.id for item in page.items)
+        if page.next_cursor is None:
+            return ids
+        assert len(page.items) == limit
+        cursor = page.next_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(date(2024, 2, 29), 12345)
+    assert decode_cursor(cursor) == (date(2024, 2, 29), 12345)
+    # Safe in a query string as is
+    assert "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"[1, 2, 3]").decode(),
+        base64.urlsafe_b64encode(b'["2024-13-01", 1]').decode(),
+        base64.urlsafe_b64encode(b'["2024-01-01", "x"]').decode(),
+        base64.urlsafe_b64encode(b"{}").decode(),
+        "é",
+    ],
+)
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 13, 50])
+def test_pages_return_every_dated_row_once_newest_first(reader, limit):
+    ids = read_all(reader, limit)
+    expected = sorted(range(1, 14), key=lambda i: (date(2024, 1, 1 + i % 4), i), reverse=True)
+    assert ids == expected
+
+
+def test_pages_with_filters(reader):
+    assert sorted(read_all(reader, 2, company="Acme")) == [i for i in range(1, 14) if i % 2]
+    assert sorted(read_all(reader, 2, tag=" Earnings ")) == [3, 6, 9, 12]
+    assert sorted(read_all(reader, 1, from_date=date(2024, 1, 3), to_date=date(2024, 1, 4))) == [
+        i for i in range(1, 14) if 1 + i % 4 in (3, 4)
+    ]
+
+
+def test_last_page_has_no_cursor(reader):
+    page = reader.list_news(limit=13)
+    assert len(page.items) == 13
+    assert page.next_cursor is None
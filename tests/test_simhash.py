@@ -0,0 +1,78 @@
+import random
+
+from config import settings
+from simhash import BITS, SimHashIndex, simhash, to_signed, to_unsigned
+
+
+def flip_bits(fingerprint, count, rnd):
+    for bit in rnd.sample(range(BITS), count):
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+
+def words(count, seed):
+    rnd = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(3000)]
+    return [rnd.choice(vocabulary) for _ in range(count)]
+
+
+def test_simhash_of_text_without_words():
+    assert simhash("") is None
+    assert simhash(" ,.; ") is None
+
+
+def test_simhash_ignores_case_and_punctuation():
+    assert simhash("Apple raises its outlook.") == simhash("apple raises, its OUTLOOK")
+    assert 0 <= simhash("Apple raises its outlook.") < 1 << BITS
+
+
+def test_signed_round_trip():
+    for fingerprint in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        signed = to_signed(fingerprint)
+        assert -(1 << 63) <= signed < 1 << 63
+        assert to_unsigned(signed) == fingerprint
+
+
+def test_bands_cover_all_bits():
+    for max_distance in (0, 3, 12, 20):
+        index = SimHashIndex(max_distance)
+        widths = [width for _, width in index.bands]
+        assert len(widths) == max_distance + 1
+        assert sum(widths) == BITS
+        assert max(widths) - min(widths) <= 1
+        assert [shift for shift, _ in index.bands] == [sum(widths[:i]) for i in range(len(widths))]
+
+
+def test_finds_every_fingerprint_within_max_distance():
+    rnd = random.Random(0)
+    for max_distance in (3, 12):
+        for _ in range(200):
+            index = SimHashIndex(max_distance)
+            fingerprint = rnd.getrandbits(BITS)
+            index.add(fingerprint, "stored")
+            assert index.find(fingerprint) == "stored"
+            assert index.find(flip_bits(fingerprint, rnd.randint(1, max_distance), rnd)) == "stored"
+            assert index.find(flip_bits(fingerprint, max_distance + 1, rnd)) is None
+
+
+def test_returns_first_added_match():
+    index = SimHashIndex(3)
+    index.add(0b1111, "first")
+    index.add(0b1110, "second")
+    assert index.find(0b1111) == "first"
+
+
+def test_default_distance_catches_lightly_rewritten_copies():
+    index = SimHashIndex(settings.near_duplicate_max_distance)
+    original = words(700, seed=1)
+    index.add(simhash(" ".join(original)), "original")
+
+    rewritten = list(original)
+    rnd = random.Random(2)
+    for position in rnd.sample(range(len(rewritten)), 5):
+        rewritten[position] = "changed"
+    syndicated = ["By", "a", "staff", "writer"] + rewritten + ["Copyright", "a", "partner", "site"]
+    assert index.find(simhash(" ".join(syndicated))) == "original"
+
+    for seed in range(3, 13):
+        assert index.find(simhash(" ".join(words(700, seed=seed)))) is None
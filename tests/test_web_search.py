@@ -0,0 +1,81 @@
+from web_search import canonicalize_url, get_dated_item, merge_window_items, plan_window_search
+
+
+def window(items, from_date="20240101", to_date="20240108"):
+    return {"from": from_date, "to": to_date, "items": items}
+
+
+def item(link, date, approximate=False):
+    return {"link": link, "date": date, "approximate": approximate}
+
+
+def test_plan_without_window():
+    assert plan_window_search(None, "20240102", "20240109") is None
+
+
+def test_plan_rejects_window_that_does_not_cover_from_date():
+    # A longer range than the stored one, or a window ending after today, is searched in full
+    assert plan_window_search(window([]), "20231231", "20240109") is None
+    assert plan_window_search(window([]), "20240109", "20240110") is None
+    assert plan_window_search(window([]), "20240102", "20240107") is None
+
+
+def test_plan_searches_from_last_day_and_drops_old_items():
+    stored = [item("a", "20240101"), item("b", "20240102"), item("c", "20240105", approximate=True)]
+    items, search_from = plan_window_search(window(stored), "20240102", "20240109")
+    assert [i["link"] for i in items] == ["b", "c"]
+    # The last day of the stored window is searched again, it may have been partial
+    assert search_from == "20240108"
+
+
+def test_plan_keeps_items_dated_on_from_date():
+    items, _ = plan_window_search(window([item("a", "20240102")]), "20240102", "20240109")
+    assert [i["link"] for i in items] == ["a"]
+
+
+def test_plan_searches_whole_range_when_an_uncertain_item_is_dropped():
+    # "a" was only known to be published on or after 20240101, it may still be inside the new range
+    stored = [item("a", "20240101", approximate=True), item("b", "20240103")]
+    items, search_from = plan_window_search(window(stored), "20240102", "20240109")
+    assert [i["link"] for i in items] == ["b"]
+    assert search_from == "20240102"
+
+
+def test_plan_same_day_rerun():
+    items, search_from = plan_window_search(window([item("a", "20240103")]), "20240101", "20240108")
+    assert [i["link"] for i in items] == ["a"]
+    assert search_from == "20240108"
+
+
+def test_repeated_runs_keep_window_at_range():
+    # The stored window starts at from_date, so it does not grow run after run
+    stored = window([])
+    for day in range(2, 20):
+        from_date, to_date = f"202401{day:02d}", f"202401{day + 7:02d}"
+        items, search_from = plan_window_search(stored, from_date, to_date)
+        result = [{"link": f"link-{day}"}]
+        stored = window(merge_window_items(items, result, search_from), from_date, to_date)
+        assert all(i["date"] >= from_date for i in stored["items"])
+    assert len(stored["items"]) <= 8
+
+
+def test_merge_keeps_known_items_and_dates_new_ones():
+    kept = [item("a", "20240103")]
+    results = [
+        {"link": "a"},
+        {"link": "b", "pagemap": {"metatags": [{"article:published_time": "2024-01-05T10:00:00Z"}]}},
+        {"link": "c"},
+        {"title": "no link"},
+    ]
+    merged = merge_window_items(kept, results, "20240104")
+    assert merged == [item("a", "20240103"), item("b", "20240105"), item("c", "20240104", approximate=True)]
+
+
+def test_dated_item_ignores_unparsable_metadata():
+    result = {"link": "a", "pagemap": {"metatags": [{"date": "yesterday-ish"}]}}
+    assert get_dated_item(result, "20240104") == item("a", "20240104", approximate=True)
+
+
+def test_canonicalize_url():
+    assert canonicalize_url("HTTPS://Www.Fool.com/investing/a/?utm_source=x&b=2&a=1#top") == "https://www.fool.com/investing/a?a=1&b=2"
+    assert canonicalize_url("https://example.com") == "https://example.com/"
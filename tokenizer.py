@@ -0,0 +1,20 @@
+from functools import lru_cache
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    # Loading an encoding reads and parses its BPE ranks, do it once per process
+    return tiktoken.encoding_for_model("gpt-3.5-turbo")
+
+
+def count_tokens(text) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens) -> str:
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
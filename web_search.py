@@ -1,15 +1,102 @@
-import requests
+import asyncio
+import json
+import os
+import random
+import httpx
 from datetime import datetime, timedelta
-import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from typing import List
 from agents import search_terms_agent
 from loguru import logger
+from artefact_store import artefact_store
+from cache import SqliteCache
 from config import settings
+from date_extractor import parse_date
+from rate_limiter import TokenBucket
 from schemas import LinkTagsSchema, SearchTermsSchema
 
 
+# One budget for every company searched by this process
+search_rate_limiter = TokenBucket(
+    rate_per_second=settings.google_search_requests_per_minute / 60,
+    capacity=settings.google_search_burst,
+)
+
+search_cache_path = os.path.join(settings.cache_dir, "search_cache.sqlite3")
+# Items of one query for one exact date window
+search_cache = (
+    SqliteCache(search_cache_path, "search_results", settings.search_cache_ttl_seconds, settings.search_cache_max_entries)
+    if settings.search_cache_enabled
+    else None
+)
+# Latest window and accumulated items of each query, used by incremental mode
+search_window_cache = (
+    SqliteCache(search_cache_path, "search_dated_windows", settings.search_cache_incremental_ttl_seconds, settings.search_cache_max_entries)
+    if settings.search_cache_enabled and settings.search_cache_incremental
+    else None
+)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "cmpid", "ncid", "ref", "src",
+    "guccounter", "guce_referrer", "guce_referrer_sig", ".tsrc", "yptr", "soc_src", "soc_trk",
+}
+
+
+def canonicalize_url(url) -> str:
+    """Key that identifies the same article found under different URLs, it is not fetched or stored.
+
+    Lowercases the scheme and host, drops the fragment, tracking parameters and
+    the trailing slash, and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def get_dated_item(item, searched_from) -> dict:
+    # Published date of a search result from its page metadata, or the start of the searched window
+    for metatags in item.get("pagemap", {}).get("metatags", []):
+        for name in ("article:published_time", "og:published_time", "datepublished", "date"):
+            published = parse_date(str(metatags.get(name, ""))) if metatags.get(name) else None
+            if published:
+                return {"link": item["link"], "date": published.strftime("%Y%m%d"), "approximate": False}
+    return {"link": item["link"], "date": searched_from, "approximate": True}
+
+
+def plan_window_search(window, from_date, to_date) -> tuple[list[dict], str] | None:
+    """Items of a stored window to keep and the date to search from, None if the window can not be reused.
+
+    Items are kept with their published date from the result metadata or, failing that, with the
+    start of the search window that found them as a lower bound. Items older than from_date are
+    dropped. If an item with only a lower bound is dropped it may still be in the window, so the
+    whole window is searched again; otherwise only the days since the last run are, the last day
+    again as it may have been partial.
+    """
+    if not window or not window["from"] <= from_date <= window["to"] <= to_date:
+        return None
+    items = [item for item in window["items"] if item["date"] >= from_date]
+    uncertain = any(item["approximate"] and item["date"] < from_date for item in window["items"])
+    return items, from_date if uncertain else window["to"]
+
+
+def merge_window_items(items, result_items, searched_from) -> list[dict]:
+    # Kept items first, then new results; a link already kept keeps its date
+    found = {item["link"]: item for item in items}
+    for item in result_items:
+        if item.get("link") and item["link"] not in found:
+            found[item["link"]] = get_dated_item(item, searched_from)
+    return list(found.values())
+
+
 class GoogleSearchClient:
-    def __init__(self, company, number_of_days, openai_client):
+    def __init__(self, company, number_of_days, openai_client, http_client=None, refresh=False):
         self.api_key = settings.google_search_api_key
         self.search_engine_id = settings.google_search_engine_id
         self.url = settings.google_search_engine_url
@@ -17,20 +104,21 @@ class GoogleSearchClient:
         self.number_of_retries = settings.google_search_number_of_retries
         self.company = company
         self.openai_client = openai_client
+        self.http_client = http_client
+        self.refresh = refresh
 
-    def get_news_links(self) -> List[LinkTagsSchema]:
-        link_tags_response = self.fetch_news()
+    async def get_news_links(self) -> List[LinkTagsSchema]:
+        link_tags_response = await self.fetch_news()
         logger.info("Links fetched. Length: {length}.".format(length=len(link_tags_response)))
         return link_tags_response
 
-    def fetch_news(self) -> List[LinkTagsSchema]:
+    async def fetch_news(self) -> List[LinkTagsSchema]:
         from_date = (datetime.now() - timedelta(days=self.news_range_in_days)).strftime("%Y%m%d")
         to_date = datetime.now().strftime("%Y%m%d")
 
-        search_terms_agent.set_company(self.company)
-        prompt = search_terms_agent.prompt(self.company)
-        logger.info(f"Querying ChatGPT to get search terms and tags")
-        schema_response = self.openai_client.query_gpt(prompt, SearchTermsSchema)
+        schema_response = await artefact_store.get_or_create(
+            self.company, "search_terms", SearchTermsSchema, self.get_search_terms, self.refresh
+        )
         pairs = schema_response.pairs
         logger.success(f"Pairs received: {pairs}")
 
@@ -42,45 +130,115 @@ class GoogleSearchClient:
             "finance.yahoo.com/news": ""
         }        
 
-        results = []
-        request_count = 0
-        seen_links = set()
-
+        searches = []
         for pair in pairs:
             for site, exclusions in sites.items():
-                if request_count >= 90:
-                    time.sleep(60)
-                    request_count = 0
-
                 query = f"{pair.search_term} site:{site}"
 
                 if exclusions:
                     exclusion_str = " ".join([f"-inurl:{url}" for url in exclusions])
                     query += f" {exclusion_str}"
 
-                params = {
-                    "q": query,
-                    "key": self.api_key,
-                    "cx": self.search_engine_id,
-                    "sort": f"date:r:{from_date}:{to_date}",
-                }
-
-                logger.info(f"Searching: {query}")
-
-                response = requests.get(self.url, params=params)
-                request_count += 1
-                result = response.json()
-
-                if "items" in result:
-                    for item in result["items"]:
-                        link = item.get("link")
-                        if link and link not in seen_links:
-                            seen_links.add(link)
-                            results.append(LinkTagsSchema(link=link, tags=[pair.tag]))
-                        elif link and link in seen_links:
-                            for result in results:
-                                if result.link == link:
-                                    result.tags.append(pair.tag)
-
-        return results
-    
\ No newline at end of file
+                searches.append((pair.tag, query))
+
+        semaphore = asyncio.Semaphore(settings.google_search_concurrency)
+
+        async def search(client, query):
+            async with semaphore:
+                return await self.search_cached(client, query, from_date, to_date)
+
+        if self.http_client is None:
+            async with httpx.AsyncClient(timeout=settings.google_search_timeout_seconds) as client:
+                responses = await asyncio.gather(*[search(client, query) for _, query in searches])
+        else:
+            responses = await asyncio.gather(*[search(self.http_client, query) for _, query in searches])
+
+        # Canonical link -> LinkTagsSchema with the link as first found, dicts keep the order links were first seen in
+        results: dict[str, LinkTagsSchema] = {}
+
+        for (tag, _), result in zip(searches, responses):
+            for item in result.get("items", []):
+                link = item.get("link")
+                if not link:
+                    continue
+                key = canonicalize_url(link)
+                if key not in results:
+                    results[key] = LinkTagsSchema(link=link, tags=[tag])
+                elif tag not in results[key].tags:
+                    results[key].tags.append(tag)
+
+        return list(results.values())
+
+    async def get_search_terms(self) -> SearchTermsSchema:
+        prompt = search_terms_agent.for_company(self.company).prompt(self.company)
+        logger.info(f"Querying ChatGPT to get search terms and tags")
+        return await self.openai_client.query_gpt(prompt, SearchTermsSchema)
+
+    async def search_cached(self, client, query, from_date, to_date) -> dict:
+        sort = f"date:r:{from_date}:{to_date}"
+        key = f"{query}|{sort}"
+        if search_cache is not None:
+            cached = await search_cache.get_async(key)
+            if cached is not None:
+                logger.info(f"Search cache hit: {query}")
+                return {"items": json.loads(cached)}
+
+        window = json.loads(await search_window_cache.get_async(query) or "null") if search_window_cache is not None else None
+        plan = plan_window_search(window, from_date, to_date)
+        if plan is not None:
+            items, search_from = plan
+            logger.info(f"Searching incrementally from {search_from}: {query}")
+            result = await self.search(client, query, f"date:r:{search_from}:{to_date}")
+            if result is None:
+                return {"items": [{"link": item["link"]} for item in items]}
+        else:
+            result = await self.search(client, query, sort)
+            if result is None:
+                return {}
+            items, search_from = [], from_date
+
+        items = merge_window_items(items, result.get("items", []), search_from)
+        links = [{"link": item["link"]} for item in items]
+
+        if search_cache is not None:
+            await search_cache.set_async(key, json.dumps(links))
+        if search_window_cache is not None:
+            await search_window_cache.set_async(query, json.dumps({"from": from_date, "to": to_date, "items": items}))
+        return {"items": links}
+
+    async def search(self, client, query, sort) -> dict | None:
+        params = {
+            "q": query,
+            "key": self.api_key,
+            "cx": self.search_engine_id,
+            "sort": sort,
+        }
+
+        for attempt in range(self.number_of_retries + 1):
+            await search_rate_limiter.acquire()
+            logger.info(f"Searching: {query}")
+            retry_after = None
+            try:
+                response = await client.get(self.url, params=params)
+                if response.status_code == 200:
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # Bad requests, invalid keys and exhausted daily quotas do not get better by retrying
+                    logger.error(f"Search failed: {error}: {response.text[:500]}. Query: {query}")
+                    return None
+                retry_after = response.headers.get("Retry-After")
+            except (httpx.TransportError, ValueError) as e:
+                error = repr(e)
+
+            if attempt == self.number_of_retries:
+                logger.error(f"Search failed after {attempt + 1} attempts: {error}. Query: {query}")
+                return None
+            if retry_after and retry_after.isdigit():
+                delay = int(retry_after)
+            else:
+                # Exponential backoff with jitter
+                delay = 2 ** attempt + random.random()
+            logger.info(f"Search failed: {error}. Retrying in {delay:.1f}s. Query: {query}")
+            await asyncio.sleep(delay)
+        return None